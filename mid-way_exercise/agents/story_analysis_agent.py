@@ -3,6 +3,7 @@ from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import sys
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,12 +11,19 @@ from dotenv import load_dotenv
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 from tools.timeline_tools import get_timeline_tools
-from tools.qa_tools import get_qa_tools
+from tools.qa_tools import generate_answer, get_qa_tools, search_documents, set_token_handler
 from tools.query_router import classify_question
 
 # Load environment variables from project root
 load_dotenv(dotenv_path=project_root.parent / ".env")
 
+# RAG Q&A questions skip the agent and run retrieval → answer directly (set RAG_FAST_PATH=0 to use the agent)
+RAG_FAST_PATH = os.getenv("RAG_FAST_PATH", "1") != "0"
+
+# Estimated agent LLM calls a RAG Q&A request takes: pick search_documents, pick generate_answer,
+# write the final reply (the agent may take more or fewer)
+ESTIMATED_AGENT_CALLS_PER_QA = 3
+
 def create_story_analysis_agent():
     """Create a story analysis agent that can do timeline summarization and RAG Q&A"""
     
@@ -37,15 +45,16 @@ def create_story_analysis_agent():
 IMPORTANT: For timeline requests, you MUST create BOTH a Map-Reduce timeline AND a Refine timeline. Never create just one.
 
 Available Timeline Tools:
-- map_reduce_timeline: Create timeline with bullet points using Map-Reduce method
-- refine_timeline: Create timeline with bullet points using Refine method
+- create_timelines: Create BOTH timelines (Map-Reduce and Refine) at the same time in one call
+- map_reduce_timeline: Create timeline with bullet points using Map-Reduce method only
+- refine_timeline: Create timeline with bullet points using Refine method only
 
 Available RAG Tools:
 - search_documents: Find relevant document chunks for a question
 - generate_answer: Generate answer using AI based on context
 
 CRITICAL RULES:
-- For TIMELINE requests ONLY: Use map_reduce_timeline and refine_timeline tools
+- For TIMELINE requests ONLY: Use the create_timelines tool
 - For RAG Q&A requests ONLY: Use search_documents and generate_answer tools
 - NEVER use both timeline and RAG tools for the same request
 - NEVER create timelines when answering Q&A questions
@@ -54,14 +63,11 @@ CRITICAL RULES:
 - DO NOT continue with additional tools after completing the request
 
 For TIMELINE requests:
-- You MUST create BOTH timelines: map_reduce_timeline AND refine_timeline
-- Step 1: Use map_reduce_timeline tool first
-- Step 2: Use refine_timeline tool second
-- Both tools will save results to separate files
+- You MUST create BOTH timelines with ONE call to create_timelines
+- create_timelines runs the Map-Reduce and Refine methods at the same time and saves each to its own file
+- Do NOT call map_reduce_timeline or refine_timeline as well, create_timelines already ran both
 - Do NOT use any RAG tools
-- Do NOT stop after just one timeline
-- You MUST complete BOTH steps before stopping
-- If you only create one timeline, you have NOT completed the request
+- STOP after create_timelines returns both timelines
 
 For RAG Q&A requests:
 - Use ONLY search_documents to find relevant chunks
@@ -88,11 +94,46 @@ Always ask for the file path if it's not provided."""),
         tools=all_tools, 
         verbose=True, 
         handle_parsing_errors=True,
-        max_iterations=10  # Allow more iterations to complete both timelines
+        max_iterations=10
     )
     
     return agent_executor
 
+def answer_question_directly(question):
+    """
+    Answer a RAG Q&A question with retrieval and one answer call, without agent planning.
+    
+    The router already decided this is a Q&A question, so the agent's planning
+    calls would only pick search_documents and then generate_answer.
+    
+    Args:
+        question: The user's question
+        
+    Returns:
+        The answer, or the retrieval error if the search failed
+    """
+    start = time.perf_counter()
+    context = search_documents.invoke(question)
+    if context.startswith("Error"):
+        # An error message is no context to answer from, skip the answer call
+        return context
+    answer = generate_answer.invoke({"question": question, "context": context})
+    print(f"\n⚡ Fast path: about {ESTIMATED_AGENT_CALLS_PER_QA} agent LLM calls skipped (estimate), "
+          f"{time.perf_counter() - start:.2f}s end to end")
+    return answer
+
+class AnswerPrinter:
+    """Print answer tokens as generate_answer streams them, so users see the answer start right away"""
+    
+    def __init__(self):
+        self.streamed = False
+    
+    def __call__(self, token):
+        if not self.streamed:
+            print("\nAssistant: ", end="", flush=True)
+            self.streamed = True
+        print(token, end="", flush=True)
+
 def main():
     """Main function to run the story analysis agent"""
     
@@ -126,6 +167,10 @@ def main():
     # Create the agent
     agent = create_story_analysis_agent()
     
+    # Answers are printed while they stream instead of after the agent finishes
+    answer_printer = AnswerPrinter()
+    set_token_handler(answer_printer)
+    
     # Start conversation
     while True:
         user_input = input("\nYou: ").strip()
@@ -139,12 +184,26 @@ def main():
             classification = classify_question(user_input)
             print(f"\n🔍 Question type: {classification.upper()}")
             
-            # Pass the classification to the agent
-            response = agent.invoke({
-                "input": user_input,
-                "request_type": classification.upper()
-            })
-            print(f"\nAssistant: {response['output']}")
+            answer_printer.streamed = False
+            start = time.perf_counter()
+            if classification == 'rag_qa' and RAG_FAST_PATH:
+                # Q&A goes straight to retrieval and answer, the agent handles everything else
+                output = answer_question_directly(user_input)
+            else:
+                # Pass the classification to the agent
+                response = agent.invoke({
+                    "input": user_input,
+                    "request_type": classification.upper()
+                })
+                output = response['output']
+                print(f"\n⏱️ Agent: {time.perf_counter() - start:.2f}s end to end")
+            
+            # A streamed answer was already shown, only print the output when nothing streamed
+            # or the stream broke off with an error
+            if answer_printer.streamed and not output.startswith("Error"):
+                print()
+            else:
+                print(f"\nAssistant: {output}")
             
         except Exception as e:
             print(f"\nError: {e}")
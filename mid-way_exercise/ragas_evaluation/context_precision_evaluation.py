@@ -15,7 +15,7 @@ from openai import OpenAI
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from tools.rerank_qa_tools import rerank_search_documents
+from tools.rerank_qa_tools import search_documents_batch
 
 # Load environment variables
 load_dotenv()
@@ -70,7 +70,7 @@ def calculate_context_precision(question, chunks):
     # Check relevance of each chunk
     scores = []
     for i, chunk in enumerate(chunks):
-        score = evaluate_chunk_relevance(question, chunk)
+        score = evaluate_chunk_relevance(question, chunk.text)
         scores.append(score)
         print(f"  Chunk {i+1} relevance: {score:.3f}")
     
@@ -78,20 +78,6 @@ def calculate_context_precision(question, chunks):
     precision = sum(scores) / len(scores)
     return precision
 
-def get_chunks_from_search(search_result):
-    """
-    Extract chunks from our search result.
-    """
-    if "Found" in search_result and "relevant chunks:" in search_result:
-        # Get the chunks part
-        chunks_text = search_result.split("relevant chunks:\n\n")[1]
-        # Split into individual chunks
-        chunks = [chunk.strip() for chunk in chunks_text.split("\n\n") if chunk.strip()]
-    else:
-        chunks = [search_result]
-    
-    return chunks
-
 def run_evaluation():
     """
     Run the context precision evaluation.
@@ -111,14 +97,23 @@ def run_evaluation():
     all_scores = []
     results = []
     
+    # Retrieve chunks for all questions with one embedding request and one query
+    search_error = None
+    try:
+        search_results = search_documents_batch(test_questions)
+    except Exception as e:
+        # Reported for every question below, like a failed per-question search
+        search_error = e
+    
     # Test each question
     for i, question in enumerate(test_questions, 1):
         print(f"\n{i}. Question: {question}")
         
         try:
             # Get chunks using our search
-            search_result = rerank_search_documents(question)
-            chunks = get_chunks_from_search(search_result)
+            if search_error:
+                raise search_error
+            chunks = search_results[i - 1]["chunks"]
             
             print(f"   Retrieved {len(chunks)} chunks")
             
@@ -129,7 +124,9 @@ def run_evaluation():
             results.append({
                 "question": question,
                 "precision": precision,
-                "num_chunks": len(chunks)
+                "num_chunks": len(chunks),
+                "chunk_ids": [chunk.chunk_id for chunk in chunks],
+                "rerank_scores": [chunk.rerank_score for chunk in chunks]
             })
             
             print(f"   Context Precision: {precision:.3f}")
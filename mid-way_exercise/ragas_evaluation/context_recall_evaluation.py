@@ -15,7 +15,7 @@ from openai import OpenAI
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from tools.rerank_qa_tools import rerank_search_documents
+from tools.rerank_qa_tools import search_documents_batch
 
 # Load environment variables
 load_dotenv()
@@ -73,7 +73,7 @@ def calculate_context_recall(question, chunks, expected_answer):
     # Check each chunk for the answer
     found_answers = 0
     for i, chunk in enumerate(chunks):
-        has_answer = check_chunk_contains_answer(question, chunk, expected_answer)
+        has_answer = check_chunk_contains_answer(question, chunk.text, expected_answer)
         if has_answer:
             found_answers += 1
             print(f"  Chunk {i+1}: Contains answer ✓")
@@ -84,18 +84,6 @@ def calculate_context_recall(question, chunks, expected_answer):
     recall = found_answers / len(chunks) if chunks else 0.0
     return recall
 
-def get_chunks_from_search(search_result):
-    """
-    Extract chunks from our search result.
-    """
-    if "Found" in search_result and "relevant chunks:" in search_result:
-        chunks_text = search_result.split("relevant chunks:\n\n")[1]
-        chunks = [chunk.strip() for chunk in chunks_text.split("\n\n") if chunk.strip()]
-    else:
-        chunks = [search_result]
-    
-    return chunks
-
 def run_evaluation():
     """
     Run the context recall evaluation.
@@ -130,6 +118,14 @@ def run_evaluation():
     all_scores = []
     results = []
     
+    # Retrieve chunks for all questions with one embedding request and one query
+    search_error = None
+    try:
+        search_results = search_documents_batch([test_case["question"] for test_case in test_questions])
+    except Exception as e:
+        # Reported for every question below, like a failed per-question search
+        search_error = e
+    
     # Test each question
     for i, test_case in enumerate(test_questions, 1):
         question = test_case["question"]
@@ -140,8 +136,9 @@ def run_evaluation():
         
         try:
             # Get chunks using our search
-            search_result = rerank_search_documents(question)
-            chunks = get_chunks_from_search(search_result)
+            if search_error:
+                raise search_error
+            chunks = search_results[i - 1]["chunks"]
             
             print(f"   Retrieved {len(chunks)} chunks")
             
@@ -153,7 +150,9 @@ def run_evaluation():
                 "question": question,
                 "expected_answer": expected,
                 "recall": recall,
-                "num_chunks": len(chunks)
+                "num_chunks": len(chunks),
+                "chunk_ids": [chunk.chunk_id for chunk in chunks],
+                "rerank_scores": [chunk.rerank_score for chunk in chunks]
             })
             
             print(f"   Context Recall: {recall:.3f}")
@@ -15,7 +15,7 @@ from openai import OpenAI
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from tools.rerank_qa_tools import rerank_search_documents, generate_answer
+from tools.rerank_qa_tools import search_documents_batch, generate_answer
 
 # Load environment variables
 load_dotenv()
@@ -66,23 +66,11 @@ Return only a number between 0 and 1:"""
         print(f"Error checking faithfulness: {e}")
         return 0.5
 
-def get_chunks_from_search(search_result):
-    """
-    Extract chunks from our search result.
-    """
-    if "Found" in search_result and "relevant chunks:" in search_result:
-        chunks_text = search_result.split("relevant chunks:\n\n")[1]
-        chunks = [chunk.strip() for chunk in chunks_text.split("\n\n") if chunk.strip()]
-    else:
-        chunks = [search_result]
-    
-    return chunks
-
 def combine_chunks(chunks):
     """
     Combine all chunks into one context string.
     """
-    return "\n\n".join(chunks)
+    return "\n\n".join(chunk.text for chunk in chunks)
 
 def run_evaluation():
     """
@@ -103,14 +91,23 @@ def run_evaluation():
     all_scores = []
     results = []
     
+    # Retrieve chunks for all questions with one embedding request and one query
+    search_error = None
+    try:
+        search_results = search_documents_batch(test_questions)
+    except Exception as e:
+        # Reported for every question below, like a failed per-question search
+        search_error = e
+    
     # Test each question
     for i, question in enumerate(test_questions, 1):
         print(f"\n{i}. Question: {question}")
         
         try:
             # Step 1: Get context chunks
-            search_result = rerank_search_documents(question)
-            chunks = get_chunks_from_search(search_result)
+            if search_error:
+                raise search_error
+            chunks = search_results[i - 1]["chunks"]
             context = combine_chunks(chunks)
             
             print(f"   Retrieved {len(chunks)} chunks")
@@ -129,6 +126,7 @@ def run_evaluation():
                 "question": question,
                 "faithfulness": faithfulness,
                 "num_chunks": len(chunks),
+                "chunk_ids": [chunk.chunk_id for chunk in chunks],
                 "generated_answer": generated_answer
             })
             
@@ -0,0 +1,111 @@
+"""
+Semantic Answer Cache
+
+Paraphrased questions ("When did the attack start?" / "What time did the attack
+begin?") reuse a stored answer instead of paying for another completion.
+- Keyed on the question embedding plus a hash of the retrieved context
+- An answer is reused only when the context is unchanged and the cosine
+  similarity of the questions passes the threshold
+- Bounded by entry count and by stored bytes, with least-recently-used eviction
+- Hit/miss counters for the hit rate
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.embedding_cache import normalize_text
+
+class SemanticAnswerCache:
+    def __init__(self, capacity=512, threshold=0.92, max_bytes=32 * 1024 * 1024):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        # entry id -> (context key, unit question embedding, answer, size in bytes)
+        self.entries = OrderedDict()
+        # context key -> entry ids, so a lookup only compares questions asked over the same context
+        self.by_context = {}
+        self.next_id = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_context_key(model, context):
+        digest = hashlib.sha256(normalize_text(context).encode("utf-8")).hexdigest()
+        return (model, digest)
+
+    @staticmethod
+    def to_unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, model, question_embedding, context):
+        """
+        Find a stored answer for a similar question over the same context.
+
+        Returns:
+            (answer, similarity), or (None, best similarity) on a miss
+        """
+        key = self.make_context_key(model, context)
+        vector = self.to_unit(question_embedding)
+        with self.lock:
+            entry_ids = list(self.by_context.get(key, ()))
+            best_similarity = 0.0
+            if entry_ids:
+                similarities = np.stack([self.entries[i][1] for i in entry_ids]) @ vector
+                best = int(np.argmax(similarities))
+                best_similarity = float(similarities[best])
+                if best_similarity >= self.threshold:
+                    self.entries.move_to_end(entry_ids[best])
+                    self.hits += 1
+                    return self.entries[entry_ids[best]][2], best_similarity
+            self.misses += 1
+            return None, best_similarity
+
+    def put(self, model, question_embedding, context, answer):
+        """Store an answer, evicting least recently used entries while over capacity or size"""
+        key = self.make_context_key(model, context)
+        vector = self.to_unit(question_embedding)
+        size = vector.nbytes + len(answer.encode("utf-8"))
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (key, vector, answer, size)
+            self.by_context.setdefault(key, set()).add(entry_id)
+            self.bytes += size
+            while self.entries and (len(self.entries) > self.capacity or self.bytes > self.max_bytes):
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, (key, vector, answer, size) = self.entries.popitem(last=False)
+        self.bytes -= size
+        ids = self.by_context[key]
+        ids.discard(entry_id)
+        if not ids:
+            del self.by_context[key]
+
+    def clear(self):
+        """Drop all entries, e.g. after switching to another collection"""
+        with self.lock:
+            self.entries.clear()
+            self.by_context.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries),
+                "bytes": self.bytes,
+                "capacity": self.capacity,
+                "threshold": self.threshold
+            }
@@ -0,0 +1,92 @@
+"""
+Accuracy and Latency Report for the Query Router
+
+Routes a labelled set of questions (none of them among the router's examples)
+and reports, for the local centroid router alone and for the combined router
+with its LLM fallback:
+- Accuracy
+- How many questions needed the LLM
+- Median routing latency
+
+Pass --llm to also route every question with the LLM only, as the baseline.
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+# Add the project root to the path so the tools can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.query_router import ROUTER_MIN_MARGIN, get_route_centroids, llm_classify_question, route_locally
+
+LABELLED_QUESTIONS = [
+    ("Can you produce a timeline of the breach?", "timeline"),
+    ("Summarize what happened over the whole day", "timeline"),
+    ("List the key events in the order they occurred", "timeline"),
+    ("Give me an overview of the incident from beginning to end", "timeline"),
+    ("Create a chronological summary of The Day Everything Slowed Down", "timeline"),
+    ("I need a timeline for the incident report", "timeline"),
+    ("Recap the story in chronological order", "timeline"),
+    ("Describe the progression of the attack across the day", "timeline"),
+    ("When did jmalik first connect to the VPN?", "rag_qa"),
+    ("What was found in the startup folder?", "rag_qa"),
+    ("Which departments joined the emergency call?", "rag_qa"),
+    ("What did the helpdesk notice first?", "rag_qa"),
+    ("Was logi_loader.dll signed?", "rag_qa"),
+    ("What happened at 2:47 AM?", "rag_qa"),
+    ("Who discovered the scheduled task?", "rag_qa"),
+    ("How did the attacker move laterally?", "rag_qa")
+]
+
+def milliseconds(start):
+    return (time.perf_counter() - start) * 1000
+
+def run_benchmark(include_llm=False):
+    # Build the centroids up front so the first question's latency is comparable
+    get_route_centroids()
+
+    local_correct = 0
+    routed_correct = 0
+    llm_calls = 0
+    local_timings = []
+    routed_timings = []
+    llm_correct = 0
+    llm_timings = []
+
+    print(f"{'Question':<66}{'Label':>10}{'Local':>10}{'Margin':>8}{'Routed':>10}")
+    print("-" * 104)
+    for question, label in LABELLED_QUESTIONS:
+        start = time.perf_counter()
+        local_route, margin = route_locally(question)
+        local_timings.append(milliseconds(start))
+
+        # Same decision as classify_question, timed including the fallback
+        routed = local_route
+        if margin < ROUTER_MIN_MARGIN:
+            llm_calls += 1
+            routed = llm_classify_question(question)
+        routed_timings.append(milliseconds(start))
+
+        local_correct += local_route == label
+        routed_correct += routed == label
+        print(f"{question[:64]:<66}{label:>10}{local_route:>10}{margin:>8.3f}{routed:>10}")
+
+        if include_llm:
+            start = time.perf_counter()
+            llm_correct += llm_classify_question(question) == label
+            llm_timings.append(milliseconds(start))
+
+    total = len(LABELLED_QUESTIONS)
+    print(f"\nLocal router:  accuracy {local_correct / total:.1%}, median {statistics.median(local_timings):.1f} ms")
+    print(f"With fallback: accuracy {routed_correct / total:.1%}, median {statistics.median(routed_timings):.1f} ms, "
+          f"{llm_calls}/{total} questions sent to the LLM (margin below {ROUTER_MIN_MARGIN})")
+    if include_llm:
+        print(f"LLM only:      accuracy {llm_correct / total:.1%}, median {statistics.median(llm_timings):.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report query router accuracy and latency")
+    parser.add_argument("--llm", action="store_true", help="Also route every question with the LLM only")
+    args = parser.parse_args()
+    run_benchmark(include_llm=args.llm)
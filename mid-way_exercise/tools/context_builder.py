@@ -0,0 +1,182 @@
+"""
+Token-Budgeted Context Builder
+
+Chooses which retrieved chunks go into the answer prompt:
+- Maximal marginal relevance (MMR): each pick trades relevance against
+  similarity to the chunks already picked, so near-duplicates come last
+- Candidates almost identical to a picked chunk (cosine similarity above
+  CONTEXT_REDUNDANCY_THRESHOLD) are left out entirely
+- Neighbouring chunks (consecutive chunk_id in the same document) share up to
+  chunk_overlap characters; the shared span is kept only once
+- Chunks are added until the tiktoken-measured token budget is used up
+"""
+
+import os
+import threading
+from dataclasses import replace
+
+import numpy as np
+import tiktoken
+
+# Prompt tokens the retrieved context may use, and candidates it is chosen from
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "256"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+
+# 1.0 ranks by relevance only, lower values favour diversity
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Candidates more similar than this to a selected chunk repeat it and are skipped
+REDUNDANCY_THRESHOLD = float(os.getenv("CONTEXT_REDUNDANCY_THRESHOLD", "0.95"))
+
+# Shorter shared spans between neighbours are treated as coincidence, not overlap
+MIN_OVERLAP_CHARS = 16
+
+ENCODING_MODEL = "gpt-3.5-turbo"
+SEPARATOR = "\n\n"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def count_tokens(text):
+    """Count tokens the way the answer model does"""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            _encoding = tiktoken.encoding_for_model(ENCODING_MODEL)
+    return len(_encoding.encode(text))
+
+def relevance_scores(chunks):
+    """Relevance of each chunk in [0, 1]: the rerank score if there is one, else the vector similarity"""
+    scores = []
+    for chunk in chunks:
+        if chunk.rerank_score is not None:
+            scores.append(chunk.rerank_score)
+        elif chunk.distance is not None:
+            scores.append(1.0 / (1.0 + chunk.distance))
+        else:
+            scores.append(1.0)  # Exact matches such as time-index hits
+    scores = np.asarray(scores, dtype=np.float64)
+    top = scores.max() if len(scores) else 0.0
+    return scores / top if top > 0 else scores
+
+def fetch_unit_embeddings(collection, chunks):
+    """Get the stored embedding of each chunk, normalized, as a matrix in chunk order"""
+    found = collection.get(ids=[chunk.chunk_id for chunk in chunks], include=["embeddings"])
+    by_id = dict(zip(found['ids'], found['embeddings']))
+    matrix = np.asarray([by_id[chunk.chunk_id] for chunk in chunks], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+def mmr_order(relevance, embeddings, lambda_mult=MMR_LAMBDA):
+    """
+    Order candidates by maximal marginal relevance.
+
+    Args:
+        relevance: Relevance of each candidate in [0, 1]
+        embeddings: Unit embeddings of the candidates, one row each
+        lambda_mult: Weight of relevance against novelty
+
+    Returns:
+        Candidate indexes in the order MMR picks them
+    """
+    similarity = embeddings @ embeddings.T
+    remaining = list(range(len(relevance)))
+    max_similarity = np.zeros(len(relevance))
+    order = []
+    while remaining:
+        mmr = lambda_mult * relevance[remaining] - (1 - lambda_mult) * max_similarity[remaining]
+        best = remaining.pop(int(np.argmax(mmr)))
+        order.append(best)
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return order
+
+def overlap_length(earlier, later):
+    """Length of the longest suffix of earlier that is also a prefix of later"""
+    for length in range(min(len(earlier), len(later)), MIN_OVERLAP_CHARS - 1, -1):
+        if earlier.endswith(later[:length]):
+            return length
+    return 0
+
+def position(chunk):
+    """(document, chunk number) of a chunk, or None if its metadata does not say"""
+    number = chunk.metadata.get('chunk_id')
+    if number is None:
+        return None
+    return (chunk.metadata.get('source'), chunk.metadata.get('document_title')), int(number)
+
+def strip_neighbour_overlap(chunk, selected_positions):
+    """Drop the text a chunk shares with an already selected neighbour"""
+    chunk_position = position(chunk)
+    if chunk_position is None:
+        return chunk.text
+    document, number = chunk_position
+    text = chunk.text
+    previous = selected_positions.get((document, number - 1))
+    if previous is not None:
+        text = text[overlap_length(previous.text, text):].lstrip()
+    following = selected_positions.get((document, number + 1))
+    if following is not None:
+        shared = overlap_length(text, following.text)
+        text = text[:len(text) - shared].rstrip()
+    return text
+
+def build_context(collection, chunks, token_budget=CONTEXT_TOKEN_BUDGET, lambda_mult=MMR_LAMBDA):
+    """
+    Choose the chunks for the answer prompt.
+
+    Args:
+        collection: Collection the chunks came from (for their stored embeddings)
+        chunks: RetrievedChunk candidates
+        token_budget: Maximum tokens of the joined context
+        lambda_mult: MMR weight of relevance against novelty
+
+    Returns:
+        RetrievedChunk list in pick order, with overlapping spans removed from their text
+    """
+    if not chunks:
+        return []
+
+    relevance = relevance_scores(chunks)
+    embeddings = None
+    if len(chunks) > 1:
+        embeddings = fetch_unit_embeddings(collection, chunks)
+        order = mmr_order(relevance, embeddings, lambda_mult)
+    else:
+        order = [0]
+
+    selected = []
+    selected_indexes = []
+    selected_positions = {}
+    used_tokens = 0
+    stripped_tokens = 0
+    redundant = 0
+    separator_tokens = count_tokens(SEPARATOR)
+    for i in order:
+        chunk = chunks[i]
+        if selected_indexes and (embeddings[selected_indexes] @ embeddings[i]).max() > REDUNDANCY_THRESHOLD:
+            redundant += 1
+            continue
+        text = strip_neighbour_overlap(chunk, selected_positions)
+        if not text:
+            continue
+        tokens = count_tokens(text) + (separator_tokens if selected else 0)
+        if used_tokens + tokens > token_budget:
+            # A smaller chunk further down may still fit
+            continue
+        used_tokens += tokens
+        stripped_tokens += count_tokens(chunk.text) - count_tokens(text)
+        selected_chunk = replace(chunk, text=text)
+        selected.append(selected_chunk)
+        selected_indexes.append(i)
+        chunk_position = position(chunk)
+        if chunk_position is not None:
+            selected_positions[chunk_position] = chunk
+
+    # Always hand over at least the best chunk, even if it alone is over budget
+    if not selected:
+        selected.append(chunks[order[0]])
+        used_tokens = count_tokens(chunks[order[0]].text)
+
+    print(f"🧩 Context: {len(selected)} of {len(chunks)} candidates, {used_tokens}/{token_budget} tokens, "
+          f"{stripped_tokens} overlapping tokens removed, {redundant} near-duplicates skipped")
+    return selected
@@ -0,0 +1,163 @@
+"""
+Cross-Encoder Reranker
+
+An optional reranker that scores (question, chunk) pairs with a small local
+cross-encoder instead of the hand-tuned time/keyword heuristic:
+- cross-encoder/ms-marco-MiniLM-L-6-v2 on CPU, loaded once per process
+- All uncached pairs of a question are scored in one batched forward pass
+- Scores are cached by (question hash, chunk id)
+- The model is loaded once, before the first question's budget starts
+- Scoring runs with a latency budget; when it is exceeded the caller falls back
+  to the heuristic, and the late scores still land in the cache for next time
+- When the model cannot be loaded or scoring fails (not installed, not
+  downloaded on an offline machine), the caller falls back to the heuristic too
+
+Select it with RERANKER=cross_encoder. Needs sentence-transformers.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from utils.embedding_cache import normalize_text
+
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Time the cross-encoder may take per question before the heuristic is used instead
+CROSS_ENCODER_BUDGET_MS = float(os.getenv("CROSS_ENCODER_BUDGET_MS", "250"))
+
+CROSS_ENCODER_CACHE_SIZE = int(os.getenv("CROSS_ENCODER_CACHE_SIZE", "10000"))
+
+class CrossEncoderReranker:
+    # Models are loaded once per process and shared by all reranker instances
+    _models = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, model=None, budget_ms=None, cache_size=None):
+        self.model = model or CROSS_ENCODER_MODEL
+        self.budget_ms = CROSS_ENCODER_BUDGET_MS if budget_ms is None else budget_ms
+        self.cache_size = cache_size or CROSS_ENCODER_CACHE_SIZE
+        self.scores = OrderedDict()
+        self.lock = threading.Lock()
+        # One worker, so forward passes never compete for the CPU cores
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cross-encoder")
+        self.fallbacks = 0
+        self.load_error = None
+
+    def load_model(self):
+        """Load the cross-encoder once per process"""
+        with CrossEncoderReranker._models_lock:
+            if self.model not in CrossEncoderReranker._models:
+                from sentence_transformers import CrossEncoder
+
+                print(f"📦 Loading cross-encoder: {self.model}")
+                CrossEncoderReranker._models[self.model] = CrossEncoder(self.model, device="cpu")
+        return CrossEncoderReranker._models[self.model]
+
+    def warm(self):
+        """
+        Load the model outside the latency budget, remembering a failed load.
+        
+        Returns:
+            True if the model is ready, False if it cannot be loaded
+        """
+        if self.load_error is None:
+            try:
+                self.load_model()
+            except Exception as e:
+                self.load_error = e
+                print(f"⚠️ Cannot load cross-encoder {self.model} ({e}), using the heuristic reranker")
+        return self.load_error is None
+
+    @staticmethod
+    def question_hash(question):
+        return hashlib.sha256(normalize_text(question).lower().encode("utf-8")).hexdigest()[:16]
+
+    def cached_scores(self, question_hash, chunks):
+        """Get the cached score of each chunk, None where there is none"""
+        with self.lock:
+            scores = []
+            for chunk in chunks:
+                key = (question_hash, chunk.chunk_id)
+                score = self.scores.get(key)
+                if score is not None:
+                    self.scores.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def store_scores(self, question_hash, chunks, scores):
+        with self.lock:
+            for chunk, score in zip(chunks, scores):
+                self.scores[(question_hash, chunk.chunk_id)] = score
+            while len(self.scores) > self.cache_size:
+                self.scores.popitem(last=False)
+
+    def predict(self, question, question_hash, chunks):
+        """Score all pairs in one batched forward pass and cache the scores"""
+        model = self.load_model()
+        logits = model.predict(
+            [(question, chunk.text) for chunk in chunks],
+            batch_size=len(chunks),
+            show_progress_bar=False
+        )
+        # Logits to (0, 1), so the scores work as relevance in the context builder
+        scores = (1.0 / (1.0 + np.exp(-np.asarray(logits, dtype=np.float64)))).tolist()
+        self.store_scores(question_hash, chunks, scores)
+        return scores
+
+    def score(self, question, chunks):
+        """
+        Score chunks for a question within the latency budget.
+
+        Args:
+            question: The question
+            chunks: RetrievedChunk candidates
+
+        Returns:
+            NumPy array with one score per chunk, or None if the budget ran out
+            or the model is not available
+        """
+        if not self.warm():
+            self.fallbacks += 1
+            return None
+        
+        start = time.perf_counter()
+        question_hash = self.question_hash(question)
+        scores = self.cached_scores(question_hash, chunks)
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            missing_chunks = [chunks[i] for i in missing]
+            future = self.executor.submit(self.predict, question, question_hash, missing_chunks)
+            try:
+                new_scores = future.result(timeout=self.budget_ms / 1000)
+            except FutureTimeoutError:
+                self.fallbacks += 1
+                print(f"⏱️ Cross-encoder over its {self.budget_ms:.0f} ms budget, using the heuristic reranker")
+                return None
+            except Exception as e:
+                self.fallbacks += 1
+                print(f"⚠️ Cross-encoder failed ({e}), using the heuristic reranker")
+                return None
+            for i, score in zip(missing, new_scores):
+                scores[i] = score
+
+        print(f"🧠 Cross-encoder scored {len(chunks)} chunks ({len(missing)} new) in "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        return np.asarray(scores, dtype=np.float64)
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_cross_encoder_reranker():
+    """Get the process-wide cross-encoder reranker"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+    return _reranker
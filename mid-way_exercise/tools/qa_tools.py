@@ -4,39 +4,87 @@ Q&A Tools for RAG System
 This file contains LangChain tools for:
 - Search Tool: Find relevant document chunks
 - Answer Tool: Generate answers using AI
+
+Retrieval returns RetrievedChunk objects, narrowed by the context builder to
+a diverse set within the token budget; the search tools turn them into text
+only when they hand them to the LLM.
+
+Answers are kept in a semantic cache, so a paraphrase of an earlier question
+over the same context is answered without another completion. Answers are
+streamed: tokens go to a registered handler as they arrive and the time to
+first token is recorded.
+
+Each tool also has a native async implementation, so ainvoke awaits the
+OpenAI requests over a pooled AsyncOpenAI client instead of running the
+blocking version in a worker thread.
 """
 
-import os
 import sys
-import chromadb
-from openai import OpenAI
-from langchain.tools import tool
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(path="../utils/chroma_db")
-collection_name = "cybersecurity-story"
-
-# Get ChromaDB collection
-try:
-    collection = chroma_client.get_collection(name=collection_name)
-    print(f"✅ Connected to ChromaDB collection: {collection_name}")
-except:
-    print(f"❌ Collection {collection_name} not found!")
-    print("Please run data_loader.py first to create the collection.")
-    collection = None
-
-# Initialize OpenAI client for embeddings
-embedding_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-@tool
-def search_documents(question: str) -> str:
+import time
+import threading
+from pathlib import Path
+from langchain.tools import StructuredTool
+
+# Add the project root to the path so the shared resources can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.rag_resources import (
+    aembed_question,
+    answer_cache,
+    embed_question,
+    get_answer_cache_stats,
+    get_async_openai_client,
+    get_collection,
+    get_openai_client,
+    get_query_embedding_backend,
+    get_time_index
+)
+from tools.context_builder import CONTEXT_CANDIDATES, build_context
+from tools.question_filters import query_chunks_filtered
+from tools.retrieval_results import chunks_from_get, chunks_from_query, format_chunks
+from utils.time_index import lookup_time_chunks
+
+ANSWER_MODEL = "gpt-3.5-turbo"
+
+def search_time_chunks(collection, question, n_results=CONTEXT_CANDIDATES):
+    """Get the chunks the time index lists for the question, or None if there are none"""
+    time_chunk_ids = lookup_time_chunks(question, get_time_index())
+    if not time_chunk_ids:
+        return None
+    found = collection.get(ids=time_chunk_ids[:n_results], include=["documents", "metadatas"])
+    return chunks_from_get(found) or None
+
+def retrieve_chunks(collection, question, n_results=CONTEXT_CANDIDATES):
+    """
+    Retrieve the context chunks for a question.
+    
+    Exact-time questions are answered from the time index, vector search is the
+    fallback. The candidates are then narrowed to a diverse set that fits the
+    context token budget.
+    
+    Returns:
+        List of RetrievedChunk, best first
+    """
+    chunks = search_time_chunks(collection, question, n_results)
+    if not chunks:
+        # Get embedding for the question using the same model as data_loader
+        question_embedding = embed_question(question)
+        
+        # Query ChromaDB for relevant chunks, narrowed by what the question names
+        chunks = chunks_from_query(query_chunks_filtered(question_embedding, question, n_results))
+    
+    return build_context(collection, chunks)
+
+async def aretrieve_chunks(collection, question, n_results=CONTEXT_CANDIDATES):
+    """Async version of retrieve_chunks; the question is embedded over the pooled async client"""
+    chunks = search_time_chunks(collection, question, n_results)
+    if not chunks:
+        # The embedded Chroma query is local and fast, only the embedding request is awaited
+        question_embedding = await aembed_question(question)
+        chunks = chunks_from_query(query_chunks_filtered(question_embedding, question, n_results))
+    
+    return build_context(collection, chunks)
+
+def _search_documents(question: str) -> str:
     """
     Search for relevant document chunks based on the question.
     
@@ -46,48 +94,32 @@ def search_documents(question: str) -> str:
     Returns:
         Relevant document chunks as a string
     """
+    collection = get_collection()
     if not collection:
         return "Error: ChromaDB collection not found. Please run data_loader.py first."
     
     try:
-        # Get embedding for the question using the same model as data_loader
-        question_embedding = embedding_client.embeddings.create(
-            model="text-embedding-3-large",
-            input=question
-        ).data[0].embedding
-        
-        # Query ChromaDB for relevant chunks
-        results = collection.query(
-            query_embeddings=[question_embedding],
-            n_results=2
-        )
-        
-        if not results['documents'][0]:
-            return "No relevant documents found."
-        
-        # Combine relevant chunks
-        relevant_chunks = "\n\n".join(results['documents'][0])
-        
-        return f"Found {len(results['documents'][0])} relevant chunks:\n\n{relevant_chunks}"
+        return format_chunks(retrieve_chunks(collection, question))
         
     except Exception as e:
         return f"Error searching documents: {str(e)}"
 
-@tool
-def generate_answer(question: str, context: str) -> str:
-    """
-    Generate an answer using AI based on the question and context.
+async def _asearch_documents(question: str) -> str:
+    """Async version of search_documents"""
+    collection = get_collection()
+    if not collection:
+        return "Error: ChromaDB collection not found. Please run data_loader.py first."
     
-    Args:
-        question: The question to answer
-        context: Relevant document chunks as context
-        
-    Returns:
-        Generated answer from AI
-    """
     try:
-        # Create prompt for AI
-        prompt = f"""You are a cybersecurity expert analyzing a cybersecurity incident. 
+        return format_chunks(await aretrieve_chunks(collection, question))
+        
+    except Exception as e:
+        return f"Error searching documents: {str(e)}"
+
+def build_answer_request(question, context):
+    """Build the chat completion arguments for answering a question from context"""
+    # Create prompt for AI
+    prompt = f"""You are a cybersecurity expert analyzing a cybersecurity incident. 
 Answer the following question based on the provided context. 
 Be accurate, concise, and provide specific details when available.
 
@@ -97,29 +129,201 @@ Context:
 Question: {question}
 
 Answer:"""
+    
+    return {
+        "model": ANSWER_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful cybersecurity expert assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 500,
+        "temperature": 0.3
+    }
+
+def find_cached_answer(question_embedding, context):
+    """Get the stored answer to a similar question over the same context, or None"""
+    model = get_query_embedding_backend().model
+    answer, similarity = answer_cache.get(model, question_embedding, context)
+    if answer is not None:
+        print(f"💾 Answer cache hit (similarity {similarity:.3f})")
+    return answer
+
+def store_answer(question_embedding, context, answer):
+    """Keep a generated answer for later paraphrases of the question"""
+    answer_cache.put(get_query_embedding_backend().model, question_embedding, context, answer)
+
+# Called with every answer token as it arrives; the agent registers one to print the answer while it streams
+_token_handler = None
+
+# Time to first token is the latency users notice, so it is tracked for every generated answer;
+# answers from the cache are only counted, their near-zero times would hide the model's latency
+_stream_stats = {"answers": 0, "cached_answers": 0, "first_token_seconds": 0.0,
+                 "last_first_token_seconds": None, "last_total_seconds": None}
+_stream_stats_lock = threading.Lock()
+
+def set_token_handler(handler):
+    """Register a function called with each answer token as it arrives, or None to stop"""
+    global _token_handler
+    _token_handler = handler
+
+def record_stream_timing(start, first_token_time):
+    """Record time to first token and total time of one generated answer"""
+    first_token_seconds = first_token_time - start
+    total_seconds = time.perf_counter() - start
+    with _stream_stats_lock:
+        _stream_stats["answers"] += 1
+        _stream_stats["first_token_seconds"] += first_token_seconds
+        _stream_stats["last_first_token_seconds"] = first_token_seconds
+        _stream_stats["last_total_seconds"] = total_seconds
+    # Starts on a new line, since streamed tokens are printed without one
+    print(f"\n⚡ First token after {first_token_seconds * 1000:.0f} ms, full answer after {total_seconds * 1000:.0f} ms")
+
+def record_cached_answer():
+    """Count an answer served from the answer cache, without a time to first token"""
+    with _stream_stats_lock:
+        _stream_stats["cached_answers"] += 1
+
+def get_streaming_stats():
+    """Average and last time to first token over all generated answers"""
+    with _stream_stats_lock:
+        answers = _stream_stats["answers"]
+        return {
+            "answers": answers,
+            "cached_answers": _stream_stats["cached_answers"],
+            "avg_first_token_seconds": _stream_stats["first_token_seconds"] / answers if answers else None,
+            "last_first_token_seconds": _stream_stats["last_first_token_seconds"],
+            "last_total_seconds": _stream_stats["last_total_seconds"]
+        }
+
+def stream_answer(question, context):
+    """
+    Generate an answer token by token.
+    
+    Args:
+        question: The question to answer
+        context: Relevant document chunks as context
         
-        # Generate answer using OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful cybersecurity expert assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.3
-        )
+    Yields:
+        Answer tokens as they arrive (an answer from the cache comes as one token)
+    """
+    start = time.perf_counter()
+    
+    # Paraphrases of an earlier question over the same context reuse its answer;
+    # the cache is only a shortcut, so a failed embedding or lookup just skips it
+    try:
+        question_embedding = embed_question(question)
+        answer = find_cached_answer(question_embedding, context)
+    except Exception as e:
+        print(f"⚠️ Answer cache skipped ({e})")
+        question_embedding, answer = None, None
+    if answer is not None:
+        record_cached_answer()
+        yield answer
+        return
+    
+    # Generate answer using OpenAI
+    stream = get_openai_client().chat.completions.create(**build_answer_request(question, context), stream=True)
+    
+    tokens = []
+    first_token_time = None
+    for chunk in stream:
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if token:
+            first_token_time = first_token_time or time.perf_counter()
+            tokens.append(token)
+            yield token
+    
+    record_stream_timing(start, first_token_time or time.perf_counter())
+    if question_embedding is not None:
+        store_answer(question_embedding, context, "".join(tokens).strip())
+
+async def astream_answer(question, context):
+    """Async version of stream_answer over the pooled async client"""
+    start = time.perf_counter()
+    
+    try:
+        question_embedding = await aembed_question(question)
+        answer = find_cached_answer(question_embedding, context)
+    except Exception as e:
+        print(f"⚠️ Answer cache skipped ({e})")
+        question_embedding, answer = None, None
+    if answer is not None:
+        record_cached_answer()
+        yield answer
+        return
+    
+    stream = await get_async_openai_client().chat.completions.create(**build_answer_request(question, context), stream=True)
+    
+    tokens = []
+    first_token_time = None
+    async for chunk in stream:
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if token:
+            first_token_time = first_token_time or time.perf_counter()
+            tokens.append(token)
+            yield token
+    
+    record_stream_timing(start, first_token_time or time.perf_counter())
+    if question_embedding is not None:
+        store_answer(question_embedding, context, "".join(tokens).strip())
+
+def _generate_answer(question: str, context: str) -> str:
+    """
+    Generate an answer using AI based on the question and context.
+    
+    Args:
+        question: The question to answer
+        context: Relevant document chunks as context
+        
+    Returns:
+        Generated answer from AI
+    """
+    try:
+        # Tokens go to the registered handler as they arrive, the tool still returns the full answer
+        tokens = []
+        for token in stream_answer(question, context):
+            tokens.append(token)
+            if _token_handler:
+                _token_handler(token)
+        return "".join(tokens).strip()
         
-        return response.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Error generating answer: {str(e)}"
+
+async def _agenerate_answer(question: str, context: str) -> str:
+    """Async version of generate_answer over the pooled async client"""
+    try:
+        tokens = []
+        async for token in astream_answer(question, context):
+            tokens.append(token)
+            if _token_handler:
+                _token_handler(token)
+        return "".join(tokens).strip()
         
     except Exception as e:
         return f"Error generating answer: {str(e)}"
 
+# invoke runs the sync implementation, ainvoke awaits the async one
+search_documents = StructuredTool.from_function(
+    func=_search_documents,
+    coroutine=_asearch_documents,
+    name="search_documents"
+)
+
+generate_answer = StructuredTool.from_function(
+    func=_generate_answer,
+    coroutine=_agenerate_answer,
+    name="generate_answer"
+)
+
 def get_qa_tools():
     """Get all Q&A tools for use with agents"""
     return [search_documents, generate_answer]
 
 # Test the tools
 if __name__ == "__main__":
+    import asyncio
+    
     print("🔍 Testing Q&A Tools...")
     
     # Test search tool
@@ -129,12 +333,38 @@ if __name__ == "__main__":
     print(f"Question: {question}")
     print(f"Result: {search_result[:200]}...")
     
-    # Test answer tool
+    # Test answer tool, printing the answer while it streams
     print("\n2. Testing Answer Tool:")
     context = "The attack started at 2:47 AM when jmalik connected via corp-vpn3."
+    set_token_handler(lambda token: print(token, end="", flush=True))
     answer_result = generate_answer.invoke({"question": question, "context": context})
+    print()
     print(f"Question: {question}")
     print(f"Context: {context}")
     print(f"Answer: {answer_result}")
     
+    # A paraphrase over the same context is answered from the semantic answer cache
+    paraphrase = "When did the attack begin?"
+    generate_answer.invoke({"question": paraphrase, "context": context})
+    print()
+    print(f"Answer cache: {get_answer_cache_stats()}")
+    set_token_handler(None)
+    
+    # Test the async tools with several questions at once
+    print("\n3. Testing Async Tools:")
+    
+    async def answer_concurrently(questions):
+        async def answer(question):
+            context = await search_documents.ainvoke(question)
+            return await generate_answer.ainvoke({"question": question, "context": context})
+        return await asyncio.gather(*(answer(question) for question in questions))
+    
+    questions = [question, "Who was the main suspect?", "What was the name of the suspicious file?"]
+    start = time.perf_counter()
+    answers = asyncio.run(answer_concurrently(questions))
+    print(f"Answered {len(answers)} questions concurrently in {time.perf_counter() - start:.2f}s")
+    for question, answer in zip(questions, answers):
+        print(f"- {question} {answer[:100]}")
+    print(f"Streaming: {get_streaming_stats()}")
+    
     print("\n✅ Q&A Tools test complete!") 
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+In-Process LRU Cache for Query Embeddings
+
+Repeated questions (from the agent and the evaluators) reuse their embedding
+from memory instead of making another embeddings request.
+- Keyed on (model, normalized question)
+- Bounded capacity with least-recently-used eviction
+- Entries expire after a time-to-live
+- Hit/miss counters for the hit rate
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+from utils.embedding_cache import normalize_text
+
+class QueryEmbeddingCache:
+    def __init__(self, capacity=1024, ttl_seconds=3600):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, question):
+        return (model, normalize_text(question).lower())
+
+    def get(self, model, question):
+        """Return the cached embedding, or None if it is missing or expired"""
+        key = self.make_key(model, question)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, model, question, embedding):
+        """Store an embedding, evicting the least recently used entry when full"""
+        key = self.make_key(model, question)
+        with self.lock:
+            self.entries[key] = (embedding, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries, e.g. after switching to another collection"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries),
+                "capacity": self.capacity
+            }
@@ -1,24 +1,126 @@
 """
 Query Router for Timeline vs RAG Classification
 
-This file contains a simple AI-powered router that classifies user questions
-and decides whether to use timeline tools or RAG tools.
+This file contains a router that classifies user questions and decides whether
+to use timeline tools or RAG tools:
+- Local router: embeds the question and compares it with the centroid of
+  labelled example questions for each route
+- LLM router: asks gpt-3.5-turbo, used only when the local router's margin
+  between the two routes is below ROUTER_MIN_MARGIN
+
+The question embedding goes through the query embedding cache, so a routed
+rag_qa question costs no extra embedding request when it is searched.
 """
 
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import sys
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the path so the shared resources can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.rag_resources import embed_questions, get_openai_client, get_query_embedding_backend, get_query_projection
+
+# Below this cosine-similarity margin between the two routes the LLM decides
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+
+# Labelled examples the route centroids are built from
+ROUTE_EXAMPLES = {
+    "timeline": [
+        "Create a timeline",
+        "Create a timeline of the cybersecurity incident",
+        "Summarize the events",
+        "Summarize the events in chronological order",
+        "Give me a chronological summary of the story",
+        "Build a timeline of The Day Everything Slowed Down",
+        "What is the sequence of events from start to finish?",
+        "Walk me through the incident step by step in order",
+        "Make a timeline summary of the document",
+        "Outline everything that happened during the day"
+    ],
+    "rag_qa": [
+        "What time did X happen?",
+        "Who was involved?",
+        "What was the file name?",
+        "What time did the attack start?",
+        "Who was the main suspect?",
+        "What was the name of the suspicious file?",
+        "What happened at 4:55 PM?",
+        "Who was in the emergency call?",
+        "Which VPN did the attacker use?",
+        "How many machines was the file copied to?"
+    ]
+}
 
-# Load environment variables
-load_dotenv()
+_centroids = {}
+_centroids_lock = threading.Lock()
+
+def get_route_centroids():
+    """
+    Get the normalized centroid of each route's example embeddings.
+    
+    Returns:
+        (route names, matrix with one centroid per row)
+    """
+    # Questions are embedded like the collection's chunks, which can change once data_loader.py runs
+    projection = get_query_projection()
+    key = (get_query_embedding_backend().model, projection and (projection.method, projection.dimensions))
+    with _centroids_lock:
+        if key not in _centroids:
+            routes = list(ROUTE_EXAMPLES)
+            centroids = []
+            for route in routes:
+                vectors = np.asarray(embed_questions(ROUTE_EXAMPLES[route]), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                centroid = vectors.mean(axis=0)
+                centroids.append(centroid / np.linalg.norm(centroid))
+            _centroids[key] = (routes, np.stack(centroids))
+        return _centroids[key]
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def route_locally(question):
+    """
+    Route a question by its nearest centroid.
+    
+    Returns:
+        (route, margin): the best route and how much closer it is than the other one
+    """
+    routes, centroids = get_route_centroids()
+    vector = np.asarray(embed_questions([question])[0], dtype=np.float32)
+    similarities = centroids @ (vector / np.linalg.norm(vector))
+    order = np.argsort(-similarities)
+    margin = float(similarities[order[0]] - similarities[order[1]])
+    return routes[order[0]], margin
 
 def classify_question(question: str) -> str:
     """
     Classify a user question as either 'timeline' or 'rag_qa'.
     
+    The local router decides when it is confident, the LLM otherwise.
+    
+    Args:
+        question: The user's question
+        
+    Returns:
+        'timeline' or 'rag_qa'
+    """
+    start = time.perf_counter()
+    try:
+        route, margin = route_locally(question)
+        if margin >= ROUTER_MIN_MARGIN:
+            print(f"🧭 Routed locally to {route} (margin {margin:.3f}, {(time.perf_counter() - start) * 1000:.0f} ms)")
+            return route
+        print(f"🧭 Local router unsure (margin {margin:.3f}), asking the LLM")
+    except Exception as e:
+        print(f"Error routing locally: {e}")
+    return llm_classify_question(question)
+
+def llm_classify_question(question: str) -> str:
+    """
+    Classify a user question as either 'timeline' or 'rag_qa' with the LLM.
+    
     Args:
         question: The user's question
         
@@ -47,7 +149,7 @@ Examples:
 Answer with only 'timeline' or 'rag_qa':"""
 
         # Get classification from OpenAI
-        response = openai_client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a classification assistant. Respond with only 'timeline' or 'rag_qa'."},
@@ -94,4 +196,6 @@ if __name__ == "__main__":
         print(f"\nQuestion: {question}")
         print(f"Classification: {classification}")
     
+    print("\nRun benchmark_router.py for accuracy and latency on a labelled set.")
+    
     print("\n✅ Query Router test complete!") 
\ No newline at end of file
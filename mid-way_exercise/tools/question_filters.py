@@ -0,0 +1,121 @@
+"""
+Question Filters for Metadata Pre-Filtering
+
+Turns what a question asks about into Chroma where / where_document filters,
+so the vector search only ranks chunks that can answer it:
+- A document named in the question: only chunks with that document_title
+- Identifiers such as logi_loader.dll or corp-vpn3, quoted phrases, and times
+  the time index has no chunks for ("14:30"): only chunks whose text contains
+  one of them
+
+Times the time index knows are answered from the index before any vector
+search, so they need no filter.
+
+When a filtered search finds nothing, the search runs again without filters.
+"""
+
+import re
+import sys
+from pathlib import Path
+
+# Add the project root to the path so the shared resources can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.rag_resources import get_document_titles, get_time_index, query_chunks
+from utils.time_index import TIME_PATTERN, lookup_time_chunks
+
+# Compound identifiers: file names, hosts, accounts with digits or separators
+IDENTIFIER_PATTERN = re.compile(r"\b[A-Za-z0-9]+(?:[._\-][A-Za-z0-9]+)+\b")
+
+# Double quotes only, apostrophes in "What's" or "jmalik's" are not quotes
+QUOTED_PATTERN = re.compile(r"[\"“]([^\"”]{3,})[\"”]")
+
+def normalize_title(text):
+    """Lowercase a title or file name and drop separators and the extension"""
+    text = re.sub(r"\.(txt|md)\b", "", text.lower())
+    return re.sub(r"[\s_\-]+", " ", text).strip()
+
+def find_document_titles(question, titles):
+    """Titles of the documents the question names"""
+    normalized_question = normalize_title(question)
+    return [title for title in titles if normalize_title(title) in normalized_question]
+
+def find_entities(question):
+    """Identifiers and quoted phrases the chunk text has to contain"""
+    entities = QUOTED_PATTERN.findall(question)
+    for identifier in IDENTIFIER_PATTERN.findall(question):
+        # Names have a digit, '_' or '.' (corp-vpn3, logi_loader.dll); "follow-up" and "p.m" are plain words
+        is_name = any(char.isdigit() or char in "._" for char in identifier)
+        is_abbreviation = all(len(part) == 1 for part in re.split(r"[._\-]", identifier))
+        if is_name and not is_abbreviation and not identifier.replace(".", "").isdigit():
+            entities.append(identifier)
+    return list(dict.fromkeys(entities))
+
+def find_unindexed_times(question, time_index):
+    """Times in the question, as written ("14:30"), that the time index has no chunks for"""
+    times = []
+    for match in TIME_PATTERN.finditer(question):
+        if not lookup_time_chunks(match.group(0), time_index):
+            # Hours and minutes only, so "4:55pm" still matches "4:55 PM" in the text
+            times.append(f"{match.group(1)}:{match.group(2)}")
+    return list(dict.fromkeys(times))
+
+def combine(conditions, operator="$and"):
+    """Combine filter conditions, leaving a single condition as it is"""
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {operator: conditions}
+
+def parse_question_filters(question, titles=None, time_index=None):
+    """
+    Build Chroma filters from a question.
+
+    Args:
+        question: The question
+        titles: Document titles in the collection (looked up if not given)
+        time_index: Time-marker index of the collection (looked up if not given)
+
+    Returns:
+        Dict with where, where_document and a list of the reasons behind them
+    """
+    titles = get_document_titles() if titles is None else titles
+    time_index = get_time_index() if time_index is None else time_index
+    where = []
+    reasons = []
+
+    # With a single document every chunk matches, so a title filter would only cost time
+    if len(titles) > 1:
+        named_titles = find_document_titles(question, titles)
+        if named_titles:
+            where.append(combine([{"document_title": title} for title in named_titles], "$or"))
+            reasons.append(f"document {', '.join(named_titles)}")
+
+    # A document's file name names the document, the chunk text does not contain it
+    title_names = {normalize_title(title) for title in titles}
+    entities = [entity for entity in find_entities(question) if normalize_title(entity) not in title_names]
+    entities += find_unindexed_times(question, time_index)
+    if entities:
+        reasons.append(f"mentions {', '.join(entities)}")
+
+    return {
+        "where": combine(where),
+        "where_document": combine([{"$contains": entity} for entity in entities], "$or"),
+        "reasons": reasons
+    }
+
+def query_chunks_filtered(question_embedding, question, n_results):
+    """
+    Query with the filters parsed from the question, falling back to an unfiltered query.
+
+    Returns:
+        Results shaped like collection.query
+    """
+    filters = parse_question_filters(question)
+    if filters["where"] or filters["where_document"]:
+        results = query_chunks(question_embedding, n_results, filters["where"], filters["where_document"])
+        if results['ids'] and results['ids'][0]:
+            print(f"🔎 Filtered search ({'; '.join(filters['reasons'])}): {len(results['ids'][0])} candidates")
+            return results
+        print("🔎 No chunks match the question filters, searching without them")
+    return query_chunks(question_embedding, n_results)
@@ -0,0 +1,288 @@
+"""
+Shared Resources for the Q&A Tools
+
+This file creates the clients and indexes the Q&A tools need, lazily and once
+per process:
+- OpenAI client, and an AsyncOpenAI client with a pooled connection per event loop
+- ChromaDB client and story collection
+- Query embedding backend and dimension projection matching the collection
+- Time-marker index and BM25 keyword index
+- Query embedding cache and semantic answer cache
+
+Nothing is created at import time, so modules that only import the tools (the
+agent, the router, the evaluators) do not pay for clients they never use.
+Everything is created behind one lock, so concurrent first calls are safe.
+
+The database location and collection name come from STORY_CHROMA_PATH and
+STORY_COLLECTION, or from configure() before first use.
+"""
+
+import os
+import sys
+import weakref
+import asyncio
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add the project root to the path so the shared utils can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tools.query_cache import QueryEmbeddingCache
+from tools.answer_cache import SemanticAnswerCache
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_CHROMA_PATH = str(Path(__file__).parent.parent / "utils" / "chroma_db")
+
+# Retrieval backend: 'chroma' (default) or a quantized scan with exact rescoring ('int8' or 'binary')
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma").lower()
+
+_settings = {
+    "chroma_path": os.getenv("STORY_CHROMA_PATH", DEFAULT_CHROMA_PATH),
+    "collection_name": os.getenv("STORY_COLLECTION", "cybersecurity-story")
+}
+_resources = {}
+_lock = threading.RLock()
+
+# Connections the async tools keep open to the OpenAI API, shared by all concurrent questions
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+_async_clients = weakref.WeakKeyDictionary()
+
+# Question embeddings reused across calls (QUERY_CACHE_SIZE entries, QUERY_CACHE_TTL seconds)
+query_embedding_cache = QueryEmbeddingCache(
+    capacity=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", "3600"))
+)
+
+# Answers reused for paraphrased questions over the same context
+# (ANSWER_CACHE_SIZE entries, ANSWER_CACHE_MAX_BYTES bytes, ANSWER_CACHE_THRESHOLD cosine similarity)
+answer_cache = SemanticAnswerCache(
+    capacity=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+    max_bytes=int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+)
+
+def configure(chroma_path=None, collection_name=None):
+    """Point the tools at another database or collection and drop any created resources"""
+    with _lock:
+        if chroma_path:
+            _settings["chroma_path"] = chroma_path
+        if collection_name:
+            _settings["collection_name"] = collection_name
+        _resources.clear()
+        query_embedding_cache.clear()
+        answer_cache.clear()
+
+def get_chroma_path():
+    """Get the ChromaDB directory the tools read from"""
+    return _settings["chroma_path"]
+
+def _get_or_create(name, factory, keep_none=True):
+    """Create a resource on first use and return the same instance afterwards"""
+    if name in _resources:
+        return _resources[name]
+    with _lock:
+        if name not in _resources:
+            resource = factory()
+            if resource is None and not keep_none:
+                return None
+            _resources[name] = resource
+        return _resources[name]
+
+def _get_or_create_for_collection(name, factory):
+    """
+    Like _get_or_create for resources that depend on the collection.
+    
+    Until the collection exists they are created on every call and not kept,
+    so they match the collection once data_loader.py has built it.
+    """
+    if get_collection() is None:
+        return factory()
+    return _get_or_create(name, factory)
+
+def get_openai_client():
+    """Get the shared OpenAI client"""
+    def create():
+        from openai import OpenAI
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _get_or_create("openai_client", create)
+
+def get_async_openai_client():
+    """
+    Get the AsyncOpenAI client for the running event loop.
+    
+    All async tools on the loop share its connection pool, so concurrent
+    questions reuse kept-alive connections instead of opening new ones.
+    Connection pools belong to the loop they were opened on, so every
+    loop gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            import httpx
+            client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                ))
+            )
+            _async_clients[loop] = client
+    return client
+
+def get_collection():
+    """Get the story collection, or None if data_loader.py has not created it yet"""
+    def create():
+        import chromadb
+        client = chromadb.PersistentClient(path=_settings["chroma_path"])
+        collection_name = _settings["collection_name"]
+        try:
+            collection = client.get_collection(name=collection_name)
+            print(f"✅ Connected to ChromaDB collection: {collection_name}")
+            return collection
+        except:
+            print(f"❌ Collection {collection_name} not found!")
+            print("Please run data_loader.py first to create the collection.")
+            return None
+    # A missing collection is looked up again next time, after data_loader.py may have run
+    return _get_or_create("collection", create, keep_none=False)
+
+def get_query_embedding_backend():
+    """Get the embedding backend the collection was built with"""
+    def create():
+        from utils.embedding_backends import get_backend_for_collection
+        return get_backend_for_collection(get_collection())
+    return _get_or_create_for_collection("embedding_backend", create)
+
+def get_query_projection():
+    """Get the dimension reduction applied to the stored chunks, or None"""
+    def create():
+        from utils.projection import load_projection_for_collection
+        return load_projection_for_collection(get_collection(), _settings["chroma_path"])
+    return _get_or_create_for_collection("query_projection", create)
+
+def get_time_index():
+    """Get the inverted index from normalized times to chunk ids"""
+    def create():
+        from utils.time_index import load_time_index
+        return load_time_index(_settings["chroma_path"], _settings["collection_name"])
+    return _get_or_create_for_collection("time_index", create)
+
+def get_bm25_index():
+    """Get the BM25 keyword index over all chunks, or None if it was not built"""
+    def create():
+        from utils.bm25_index import load_bm25_index
+        return load_bm25_index(_settings["chroma_path"], _settings["collection_name"])
+    return _get_or_create_for_collection("bm25_index", create)
+
+def get_document_titles():
+    """Get the distinct document titles in the collection"""
+    def create():
+        collection = get_collection()
+        if not collection:
+            return []
+        metadatas = collection.get(include=["metadatas"])['metadatas']
+        return sorted({(metadata or {}).get('document_title') for metadata in metadatas} - {None})
+    return _get_or_create_for_collection("document_titles", create)
+
+def embed_question(question):
+    """Embed a question with the collection's backend and projection, reusing cached embeddings"""
+    return embed_questions([question])[0]
+
+def embed_questions(questions):
+    """
+    Embed many questions with one embedding request for the ones not cached yet.
+
+    Returns:
+        List of question embeddings in the same order as questions
+    """
+    backend = get_query_embedding_backend()
+    embeddings, missing = _cached_question_embeddings(backend, questions)
+    if missing:
+        new_embeddings = backend.embed([questions[i] for i in missing])
+        _store_question_embeddings(backend, questions, embeddings, missing, new_embeddings)
+    return embeddings
+
+async def aembed_question(question):
+    """Async version of embed_question"""
+    return (await aembed_questions([question]))[0]
+
+async def aembed_questions(questions):
+    """Async version of embed_questions, sending the request over the pooled async client"""
+    backend = get_query_embedding_backend()
+    embeddings, missing = _cached_question_embeddings(backend, questions)
+    if missing:
+        # Only the OpenAI backend sends a request, the local one must work without an API key
+        client = get_async_openai_client() if backend.name == "openai" else None
+        new_embeddings = await backend.aembed([questions[i] for i in missing], client)
+        _store_question_embeddings(backend, questions, embeddings, missing, new_embeddings)
+    return embeddings
+
+def _cached_question_embeddings(backend, questions):
+    """Look the questions up in the query cache and list the positions that missed"""
+    embeddings = [query_embedding_cache.get(backend.model, question) for question in questions]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    return embeddings, missing
+
+def _store_question_embeddings(backend, questions, embeddings, missing, new_embeddings):
+    """Project new embeddings like the stored chunks, fill them in and cache them"""
+    projection = get_query_projection()
+    if projection:
+        new_embeddings = projection.apply(new_embeddings)
+    # Without a collection the projection is unknown, so these embeddings are not kept either
+    keep = get_collection() is not None
+    for i, embedding in zip(missing, new_embeddings):
+        embeddings[i] = embedding
+        if keep:
+            query_embedding_cache.put(backend.model, questions[i], embedding)
+
+def get_query_cache_stats():
+    """Hit/miss counters of the in-process query embedding cache"""
+    return query_embedding_cache.stats()
+
+def get_answer_cache_stats():
+    """Hit/miss counters of the semantic answer cache"""
+    return answer_cache.stats()
+
+def query_chunks(question_embedding, n_results, where=None, where_document=None):
+    """
+    Query the collection with the selected retrieval backend.
+    
+    Filtered queries always go to Chroma, which applies the filters before ranking.
+    """
+    if where or where_document:
+        return get_collection().query(
+            query_embeddings=[question_embedding],
+            n_results=n_results,
+            where=where,
+            where_document=where_document
+        )
+    return query_chunks_batch([question_embedding], n_results)
+
+def query_chunks_batch(question_embeddings, n_results):
+    """
+    Query the collection for several questions at once.
+
+    With the Chroma backend this is a single multi-query collection.query call.
+
+    Returns:
+        Results shaped like collection.query, one inner list per question
+    """
+    collection = get_collection()
+    if RETRIEVAL_BACKEND == "chroma":
+        return collection.query(
+            query_embeddings=question_embeddings,
+            n_results=n_results
+        )
+    from utils.quantized_index import get_quantized_index
+    index = get_quantized_index(collection, _settings["chroma_path"], RETRIEVAL_BACKEND)
+    merged = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+    for question_embedding in question_embeddings:
+        results = index.query(collection, question_embedding, n_results)
+        for key in merged:
+            merged[key].extend(results[key])
+    return merged
@@ -2,188 +2,442 @@
 Reranked Q&A Tools for RAG System
 
 This file contains LangChain tools with reranking to improve retrieval precision.
+rerank_search_documents and generate_answer also have native async
+implementations for ainvoke. Reranking uses the time/keyword heuristic, or a
+local cross-encoder when RERANKER=cross_encoder (or the tool's reranker
+argument) selects it.
 """
 
 import os
 import sys
-import chromadb
+import asyncio
+from pathlib import Path
 import re
-from openai import OpenAI
-from langchain.tools import tool
-from dotenv import load_dotenv
+import logging
+import threading
+from collections import Counter
+import numpy as np
+from langchain.tools import StructuredTool, tool
 
-# Load environment variables
-load_dotenv()
+# Add the project root to the path so the shared resources can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.rag_resources import (
+    RETRIEVAL_BACKEND,
+    aembed_question,
+    embed_question,
+    embed_questions,
+    get_collection,
+    get_bm25_index,
+    get_query_cache_stats,
+    get_time_index,
+    query_chunks,
+    query_chunks_batch
+)
+from tools.qa_tools import generate_answer
+from tools.context_builder import build_context
+from tools.cross_encoder_reranker import get_cross_encoder_reranker
+from tools.question_filters import parse_question_filters, query_chunks_filtered
+from tools.retrieval_results import chunk_texts, chunks_from_get, chunks_from_query, format_chunks
+from utils.time_index import lookup_time_chunks
+from utils.bm25_index import reciprocal_rank_fusion
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
 
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(path="../utils/chroma_db")
-collection_name = "cybersecurity-story"
+# Candidates pulled for reranking; the quantized scan can afford a much larger pool
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "8" if RETRIEVAL_BACKEND == "chroma" else "64"))
 
-# Get ChromaDB collection
-try:
-    collection = chroma_client.get_collection(name=collection_name)
-    print(f"✅ Connected to ChromaDB collection: {collection_name}")
-except:
-    print(f"❌ Collection {collection_name} not found!")
-    print("Please run data_loader.py first to create the collection.")
-    collection = None
+# 'fixed' always pulls RERANK_CANDIDATES; 'adaptive' starts small and widens only for ambiguous questions
+CANDIDATE_DEPTH = os.getenv("CANDIDATE_DEPTH", "fixed").lower()
+ADAPTIVE_MIN_CANDIDATES = int(os.getenv("ADAPTIVE_MIN_CANDIDATES", "4"))
+ADAPTIVE_MAX_CANDIDATES = int(os.getenv("ADAPTIVE_MAX_CANDIDATES", "32"))
 
-# Initialize OpenAI client for embeddings
-embedding_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Results are ambiguous when the farthest candidate is within this relative distance of the closest
+ADAPTIVE_GAP = float(os.getenv("ADAPTIVE_GAP", "0.1"))
+
+# Chosen depth of every query, for tuning the latency/recall trade-off
+depth_counts = Counter()
+_depth_lock = threading.Lock()
+
+# Patterns and word lists are built once instead of on every rerank call
+TIME_PATTERN = re.compile(r'\b(?:At\s+)?\d{1,2}:\d{2}\s*(?:AM|PM)\b')
+QUESTION_WORDS = frozenset(['what', 'when', 'where', 'who', 'why', 'how', 'did', 'happened', 'at', 'in', 'on'])
+TEMPORAL_MARKERS = ('time', 'when', 'at', 'pm', 'am', 'emergency', 'call')
+
+# Reranker used unless a call picks one: 'heuristic' (default) or 'cross_encoder'
+RERANKER = os.getenv("RERANKER", "heuristic").lower()
 
 def extract_time_from_question(question):
     """Extract time patterns from question"""
-    time_pattern = r'\b(?:At\s+)?\d{1,2}:\d{2}\s*(?:AM|PM)\b'
-    times = re.findall(time_pattern, question)
-    return times
+    return TIME_PATTERN.findall(question)
 
 def extract_keywords_from_question(question):
     """Extract important keywords from question"""
     # Remove common question words
-    question_words = ['what', 'when', 'where', 'who', 'why', 'how', 'did', 'happened', 'at', 'in', 'on']
     words = question.lower().split()
-    keywords = [word for word in words if word not in question_words and len(word) > 2]
-    return keywords
+    return [word for word in words if word not in QUESTION_WORDS and len(word) > 2]
+
+def count_matches(terms, texts):
+    """Count, for each text, how many of the terms it contains"""
+    if not terms:
+        return np.zeros(len(texts))
+    return np.array([sum(term in text for term in terms) for text in texts], dtype=np.float64)
 
-def rerank_chunks(chunks, distances, question):
+def score_chunks(chunks, distances, question):
     """
-    Rerank chunks based on question-specific criteria
+    Score all candidate chunks for a question at once.
+    
+    score = similarity * 2^(times found) * (1 + 0.3 * keywords found) * (1 + 0.1 * temporal markers found)
+    
+    Returns:
+        NumPy array with one score per chunk
     """
-    # Extract patterns from question
     times = extract_time_from_question(question)
     keywords = extract_keywords_from_question(question)
     
-    # Create list of (chunk, distance, score) tuples
-    chunk_scores = []
+    # Lowercase each candidate once
+    lowered = [chunk.lower() for chunk in chunks]
+    
+    similarity = 1.0 / (1.0 + np.asarray(distances, dtype=np.float64))  # Convert distance to similarity score
+    time_matches = count_matches(times, chunks)  # Times are matched case-sensitively
+    keyword_matches = count_matches(keywords, lowered)
+    temporal_matches = count_matches(TEMPORAL_MARKERS, lowered)
     
-    for chunk, distance in zip(chunks, distances):
-        score = 1.0 / (1.0 + distance)  # Convert distance to similarity score
+    scores = similarity * np.power(2.0, time_matches) * (1.0 + 0.3 * keyword_matches) * (1.0 + 0.1 * temporal_matches)
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Rerank %d candidates: %d with time matches, %d with keyword matches",
+                     len(chunks), int(np.count_nonzero(time_matches)), int(np.count_nonzero(keyword_matches)))
+    return scores
+
+def rerank_chunks(chunks, distances, question, top_n=2):
+    """
+    Rerank chunks based on question-specific criteria
+    """
+    if not chunks:
+        return []
+    
+    scores = score_chunks(chunks, distances, question)
+    
+    # Highest score first; the stable sort keeps retrieval order for ties
+    order = np.argsort(-scores, kind='stable')[:top_n]
+    return [chunks[i] for i in order]
+
+def rerank_results(chunks, question, top_n=2, reranker=None):
+    """
+    Rerank retrieved chunks and record each one's rerank score.
+    
+    Args:
+        chunks: RetrievedChunk candidates (chunks without a distance count as exact matches)
+        question: The question the chunks were retrieved for
+        top_n: How many chunks to keep (None keeps all of them, reordered)
+        reranker: 'heuristic' or 'cross_encoder' (defaults to RERANKER); the
+            cross-encoder falls back to the heuristic when over its latency budget
         
-        # Boost score for chunks containing specific times
-        if times:
-            for time in times:
-                if time in chunk:
-                    score *= 2.0  # Double the score
-                    print(f"🎯 Boosted chunk containing '{time}'")
+    Returns:
+        The top_n RetrievedChunk objects, best first
+    """
+    if not chunks:
+        return []
+    
+    scores = None
+    if (reranker or RERANKER) == "cross_encoder":
+        scores = get_cross_encoder_reranker().score(question, chunks)
+    if scores is None:
+        distances = [0.0 if chunk.distance is None else chunk.distance for chunk in chunks]
+        scores = score_chunks(chunk_texts(chunks), distances, question)
+    for chunk, score in zip(chunks, scores):
+        chunk.rerank_score = float(score)
+    
+    # Highest score first; the stable sort keeps retrieval order for ties
+    order = np.argsort(-scores, kind='stable')[:top_n]
+    return [chunks[i] for i in order]
+
+def search_time_index(collection, question, reranker=None):
+    """Rerank all chunks the time index lists for the question, or return None if there are none"""
+    time_chunk_ids = lookup_time_chunks(question, get_time_index())
+    if not time_chunk_ids:
+        return None
+    found = collection.get(ids=time_chunk_ids, include=["documents", "metadatas"])
+    if not found['documents']:
+        return None
+    print(f"🕒 Time index hit: {len(found['documents'])} chunks")
+    return rerank_results(chunks_from_get(found), question, top_n=None, reranker=reranker)
+
+def search_documents_batch(questions, reranker=None):
+    """
+    Retrieve and rerank chunks for many questions at once.
+    
+    All questions that need vector search are embedded in one request.
+    Questions without metadata filters are sent to Chroma in one multi-query
+    collection.query call. Questions with filters, and all questions in
+    adaptive depth mode, are queried one by one like rerank_search_documents,
+    so the batch retrieves the same candidates. Each question is then
+    reranked on its own.
+    
+    Args:
+        questions: List of questions
+        reranker: 'heuristic' or 'cross_encoder' (defaults to RERANKER)
         
-        # Boost score for chunks containing keywords
-        if keywords:
-            keyword_matches = sum(1 for keyword in keywords if keyword.lower() in chunk.lower())
-            if keyword_matches > 0:
-                score *= (1.0 + keyword_matches * 0.3)  # Boost by 30% per keyword
-                print(f"🔑 Boosted chunk with {keyword_matches} keyword matches")
+    Returns:
+        List with one dict per question: question, chunks (RetrievedChunk
+        objects chosen by the context builder, best first) and source
+        ('time_index', 'vector' or 'none')
+    """
+    collection = get_collection()
+    if not collection:
+        raise RuntimeError("ChromaDB collection not found. Please run data_loader.py first.")
+    
+    results = [{"question": question, "chunks": [], "source": "none"} for question in questions]
+    
+    vector_positions = []
+    for i, question in enumerate(questions):
+        time_chunks = search_time_index(collection, question, reranker)
+        if time_chunks:
+            results[i].update(chunks=build_context(collection, time_chunks), source="time_index")
+        else:
+            vector_positions.append(i)
+    
+    batched = []
+    if vector_positions:
+        embeddings = embed_questions([questions[i] for i in vector_positions])
+        candidates = {}
+        for i, embedding in zip(vector_positions, embeddings):
+            filters = parse_question_filters(questions[i])
+            if CANDIDATE_DEPTH == "adaptive" or filters["where"] or filters["where_document"]:
+                question_results, _ = query_candidates(embedding, questions[i])
+                candidates[i] = chunks_from_query(question_results)
+            else:
+                batched.append((i, embedding))
         
-        # Boost score for chunks containing temporal markers
-        temporal_markers = ['time', 'when', 'at', 'pm', 'am', 'emergency', 'call']
-        temporal_matches = sum(1 for marker in temporal_markers if marker.lower() in chunk.lower())
-        if temporal_matches > 0:
-            score *= (1.0 + temporal_matches * 0.1)  # Small boost for temporal content
+        if batched:
+            batch = query_chunks_batch([embedding for _, embedding in batched], n_results=RERANK_CANDIDATES)
+            for row, (i, _) in enumerate(batched):
+                candidates[i] = chunks_from_query(batch, row)
         
-        chunk_scores.append((chunk, distance, score))
+        for i in vector_positions:
+            if candidates[i]:
+                reranked = rerank_results(candidates[i], questions[i], top_n=None, reranker=reranker)
+                results[i].update(chunks=build_context(collection, reranked), source="vector")
     
-    # Sort by score (highest first)
-    chunk_scores.sort(key=lambda x: x[2], reverse=True)
+    print(f"📦 Batch search: {len(questions)} questions, {len(batched)} via one vector query, "
+          f"{len(vector_positions) - len(batched)} filtered or adaptive")
+    return results
+
+def is_ambiguous(distances):
+    """
+    Check whether the top candidates are too close together to trust.
     
-    # Return top 2 chunks after reranking
-    return [chunk for chunk, distance, score in chunk_scores[:2]]
+    When the farthest candidate is nearly as close as the best one, the
+    distances do not separate relevant from irrelevant chunks yet and more
+    candidates are needed.
+    """
+    if len(distances) < 2:
+        return False
+    best = distances[0]
+    return (distances[-1] - best) / max(abs(best), 1e-6) < ADAPTIVE_GAP
 
-@tool
-def rerank_search_documents(question: str) -> str:
+def record_depth(question, depth):
+    """Count and log the candidate depth chosen for a query"""
+    with _depth_lock:
+        depth_counts[depth] += 1
+    logger.info("Candidate depth %d for question: %s", depth, question)
+    print(f"📏 Candidate depth: {depth}")
+
+def get_depth_stats():
+    """How often each candidate depth was chosen, and the mean depth"""
+    with _depth_lock:
+        total = sum(depth_counts.values())
+        return {
+            "queries": total,
+            "depths": dict(sorted(depth_counts.items())),
+            "mean_depth": sum(depth * count for depth, count in depth_counts.items()) / total if total else None
+        }
+
+def query_candidates(question_embedding, question):
+    """
+    Query the reranking candidates for a question.
+    
+    The query is narrowed by the filters parsed from the question. In
+    adaptive mode it starts with ADAPTIVE_MIN_CANDIDATES and doubles
+    the depth, up to ADAPTIVE_MAX_CANDIDATES, while the results are ambiguous.
+    
+    Returns:
+        (results shaped like collection.query, chosen depth)
+    """
+    if CANDIDATE_DEPTH != "adaptive":
+        depth = RERANK_CANDIDATES
+        results = query_chunks_filtered(question_embedding, question, depth)
+    else:
+        depth = ADAPTIVE_MIN_CANDIDATES
+        while True:
+            results = query_chunks_filtered(question_embedding, question, depth)
+            distances = results['distances'][0] if results['distances'] else []
+            # Stop at the limit, when the collection has no more chunks, or once the top results separate
+            if depth >= ADAPTIVE_MAX_CANDIDATES or len(distances) < depth or not is_ambiguous(distances):
+                break
+            depth = min(depth * 2, ADAPTIVE_MAX_CANDIDATES)
+    
+    record_depth(question, depth)
+    return results, depth
+
+def rerank_vector_results(collection, results, question, reranker=None):
+    """Rerank the candidates of a single-question query and build the context from them"""
+    candidates = chunks_from_query(results)
+    
+    print(f"📊 Retrieved {len(candidates)} candidates for reranking")
+    
+    # Step 2: Rerank chunks, then pick a diverse set within the token budget
+    reranked_chunks = build_context(collection, rerank_results(candidates, question, top_n=None, reranker=reranker))
+    
+    print(f"🎯 Selected {len(reranked_chunks)} chunks after reranking")
+    return reranked_chunks
+
+def rerank_retrieve(collection, question, reranker=None):
+    """
+    Retrieve reranked chunks for a question.
+    
+    Args:
+        collection: The story collection
+        question: The question
+        reranker: 'heuristic' or 'cross_encoder' (defaults to RERANKER)
+        
+    Returns:
+        (RetrievedChunk list best first, source label)
+    """
+    # Exact-time questions are answered from the time index, vector search is the fallback
+    reranked_chunks = search_time_index(collection, question, reranker)
+    if reranked_chunks:
+        return build_context(collection, reranked_chunks), "time index"
+    
+    # Step 1: Semantic search with more results
+    question_embedding = embed_question(question)
+    
+    # Get more candidates for reranking
+    results, _ = query_candidates(question_embedding, question)
+    
+    return rerank_vector_results(collection, results, question, reranker), "reranked"
+
+async def arerank_retrieve(collection, question, reranker=None):
+    """Async version of rerank_retrieve; the question is embedded over the pooled async client"""
+    if (reranker or RERANKER) == "cross_encoder":
+        # The cross-encoder's forward pass is CPU work, keep it off the event loop
+        return await asyncio.to_thread(rerank_retrieve, collection, question, reranker)
+    
+    reranked_chunks = search_time_index(collection, question, reranker)
+    if reranked_chunks:
+        return build_context(collection, reranked_chunks), "time index"
+    
+    question_embedding = await aembed_question(question)
+    results, _ = query_candidates(question_embedding, question)
+    
+    return rerank_vector_results(collection, results, question, reranker), "reranked"
+
+def _rerank_search_documents(question: str, reranker: str = "") -> str:
     """
     Search for relevant document chunks using semantic search with reranking.
     
     Args:
         question: The question to search for
+        reranker: 'heuristic' or 'cross_encoder'; leave empty for the configured default
         
     Returns:
         Relevant document chunks as a string
     """
+    collection = get_collection()
     if not collection:
         return "Error: ChromaDB collection not found. Please run data_loader.py first."
     
     try:
         print(f"🔍 Reranked search for: '{question}'")
+        return format_chunks(*rerank_retrieve(collection, question, reranker or None))
         
-        # Step 1: Semantic search with more results
-        question_embedding = embedding_client.embeddings.create(
-            model="text-embedding-3-large",
-            input=question
-        ).data[0].embedding
-        
-        # Get more candidates for reranking
-        results = collection.query(
-            query_embeddings=[question_embedding],
-            n_results=8  # Get more candidates
-        )
-        
-        chunks = results['documents'][0] if results['documents'][0] else []
-        distances = results['distances'][0] if results['distances'][0] else []
-        
-        print(f"📊 Retrieved {len(chunks)} candidates for reranking")
-        
-        if not chunks:
-            return "No relevant documents found."
-        
-        # Step 2: Rerank chunks
-        reranked_chunks = rerank_chunks(chunks, distances, question)
-        
-        print(f"🎯 Selected {len(reranked_chunks)} chunks after reranking")
-        
-        # Combine relevant chunks
-        relevant_chunks = "\n\n".join(reranked_chunks)
-        
-        return f"Found {len(reranked_chunks)} relevant chunks (reranked):\n\n{relevant_chunks}"
+    except Exception as e:
+        return f"Error searching documents: {str(e)}"
+
+async def _arerank_search_documents(question: str, reranker: str = "") -> str:
+    """Async version of rerank_search_documents"""
+    collection = get_collection()
+    if not collection:
+        return "Error: ChromaDB collection not found. Please run data_loader.py first."
+    
+    try:
+        print(f"🔍 Reranked search for: '{question}'")
+        return format_chunks(*(await arerank_retrieve(collection, question, reranker or None)))
         
     except Exception as e:
         return f"Error searching documents: {str(e)}"
 
+# invoke runs the sync implementation, ainvoke awaits the async one
+rerank_search_documents = StructuredTool.from_function(
+    func=_rerank_search_documents,
+    coroutine=_arerank_search_documents,
+    name="rerank_search_documents"
+)
+
+def hybrid_retrieve(collection, question):
+    """
+    Retrieve chunks by fusing semantic and BM25 keyword rankings.
+    
+    Returns:
+        RetrievedChunk list chosen by the context builder, with the fused score as rerank_score
+    """
+    # Semantic candidates
+    results = query_chunks(embed_question(question), n_results=RERANK_CANDIDATES)
+    candidates = {chunk.chunk_id: chunk for chunk in chunks_from_query(results)}
+    vector_ids = list(candidates)
+    
+    # Keyword candidates from every chunk
+    bm25_index = get_bm25_index()
+    if bm25_index is None:
+        print("⚠️ BM25 index not found, run data_loader.py to build it. Using semantic results only.")
+        keyword_ids = []
+    else:
+        keyword_ids = [chunk_id for chunk_id, score in bm25_index.search(question, RERANK_CANDIDATES)]
+    
+    print(f"📊 {len(vector_ids)} semantic and {len(keyword_ids)} keyword candidates")
+    
+    fused = reciprocal_rank_fusion([vector_ids, keyword_ids])
+    
+    # Keyword-only hits still need their text
+    missing_ids = [chunk_id for chunk_id, score in fused if chunk_id not in candidates]
+    if missing_ids:
+        found = collection.get(ids=missing_ids, include=["documents", "metadatas"])
+        candidates.update((chunk.chunk_id, chunk) for chunk in chunks_from_get(found))
+    
+    selected_chunks = []
+    for chunk_id, score in fused:
+        if chunk_id in candidates:
+            candidates[chunk_id].rerank_score = score
+            selected_chunks.append(candidates[chunk_id])
+    return build_context(collection, selected_chunks)
+
 @tool
-def generate_answer(question: str, context: str) -> str:
+def hybrid_search_documents(question: str) -> str:
     """
-    Generate an answer using AI based on the question and context.
+    Search for relevant document chunks by combining BM25 keyword search over
+    all chunks with semantic search, fused by reciprocal rank. Best for questions
+    that name exact identifiers such as file names, usernames or hosts.
     
     Args:
-        question: The question to answer
-        context: Relevant document chunks as context
+        question: The question to search for
         
     Returns:
-        Generated answer from AI
+        Relevant document chunks as a string
     """
+    collection = get_collection()
+    if not collection:
+        return "Error: ChromaDB collection not found. Please run data_loader.py first."
+    
     try:
-        # Create prompt for AI
-        prompt = f"""You are a cybersecurity expert analyzing a cybersecurity incident. 
-Answer the following question based on the provided context. 
-Be accurate, concise, and provide specific details when available.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-        
-        # Generate answer using OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful cybersecurity expert assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.3
-        )
-        
-        return response.choices[0].message.content.strip()
+        print(f"🔍 Hybrid search for: '{question}'")
+        return format_chunks(hybrid_retrieve(collection, question), "hybrid")
         
     except Exception as e:
-        return f"Error generating answer: {str(e)}"
+        return f"Error searching documents: {str(e)}"
 
 def get_rerank_qa_tools():
     """Get all reranked Q&A tools for use with agents"""
-    return [rerank_search_documents, generate_answer]
+    return [rerank_search_documents, hybrid_search_documents, generate_answer]
 
 # Test the tools
 if __name__ == "__main__":
@@ -196,6 +450,11 @@ if __name__ == "__main__":
     print(f"Question: {question}")
     print(f"Result: {search_result[:200]}...")
     
+    # Asking again is served from the query embedding cache
+    rerank_search_documents.invoke(question)
+    print(f"Query cache: {get_query_cache_stats()}")
+    print(f"Candidate depth: {get_depth_stats()}")
+    
     # Test answer tool
     print("\n2. Testing Answer Tool:")
     context = "4:55 PM, I joined the emergency call. Legal, security, and two of the VPs were on."
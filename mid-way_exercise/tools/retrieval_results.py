@@ -0,0 +1,53 @@
+"""
+Typed Retrieval Results
+
+The search functions return RetrievedChunk objects instead of one string:
+- Chunk id, text, vector distance, rerank score and metadata per chunk
+- Built from collection.query / collection.get results
+- Rendered to text only at the LLM-tool boundary (format_chunks), so the
+  evaluators and other callers use ids and scores directly and never re-parse
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+@dataclass
+class RetrievedChunk:
+    chunk_id: str
+    text: str
+    distance: Optional[float] = None
+    rerank_score: Optional[float] = None
+    metadata: dict = field(default_factory=dict)
+
+def chunks_from_query(results, row=0):
+    """Turn one question's row of a collection.query result into RetrievedChunk objects"""
+    if not results['ids'] or not results['ids'][row]:
+        return []
+    ids = results['ids'][row]
+    documents = (results.get('documents') or [[]])[row] or [""] * len(ids)
+    metadatas = (results.get('metadatas') or [[]])[row] or [None] * len(ids)
+    distances = (results.get('distances') or [[]])[row] or [None] * len(ids)
+    return [
+        RetrievedChunk(chunk_id, document, distance, metadata=metadata or {})
+        for chunk_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+    ]
+
+def chunks_from_get(found):
+    """Turn a collection.get result into RetrievedChunk objects (no distances)"""
+    metadatas = found.get('metadatas') or [None] * len(found['ids'])
+    return [
+        RetrievedChunk(chunk_id, document, metadata=metadata or {})
+        for chunk_id, document, metadata in zip(found['ids'], found['documents'], metadatas)
+    ]
+
+def chunk_texts(chunks):
+    """Get the text of each chunk"""
+    return [chunk.text for chunk in chunks]
+
+def format_chunks(chunks, label=""):
+    """Render retrieved chunks as the text the search tools return to the LLM"""
+    if not chunks:
+        return "No relevant documents found."
+    suffix = f" ({label})" if label else ""
+    relevant_chunks = "\n\n".join(chunk_texts(chunks))
+    return f"Found {len(chunks)} relevant chunks{suffix}:\n\n{relevant_chunks}"
@@ -9,6 +9,8 @@ import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 
@@ -69,6 +71,32 @@ def resolve_story_path(file_path):
     print(f"DEBUG: File not found in any location")
     raise FileNotFoundError(f"Could not find file: {file_path}")
 
+def build_map_reduce_timeline(resolved_path):
+    """Create, validate and save the Map-Reduce timeline of a resolved story file"""
+    # Get timeline using map-reduce method
+    timeline = map_reduce_timeline_function(resolved_path)
+    
+    # Validate and improve the timeline
+    validated_timeline = validate_timeline_answer(timeline)
+    
+    # Save to file
+    output_file = save_timeline_to_file(validated_timeline, resolved_path, "map_reduce")
+    
+    return f"Timeline created using Map-Reduce method and saved to {output_file}:\n\n{validated_timeline}"
+
+def build_refine_timeline(resolved_path):
+    """Create, validate and save the Refine timeline of a resolved story file"""
+    # Get timeline using refine method
+    timeline = refine_timeline_function(resolved_path)
+    
+    # Validate and improve the timeline
+    validated_timeline = validate_timeline_answer(timeline)
+    
+    # Save to file
+    output_file = save_timeline_to_file(validated_timeline, resolved_path, "refine")
+    
+    return f"Timeline created using Refine method and saved to {output_file}:\n\n{validated_timeline}"
+
 @tool
 def map_reduce_timeline(file_path: str) -> str:
     """
@@ -82,16 +110,7 @@ def map_reduce_timeline(file_path: str) -> str:
     """
     # Resolve file path
     resolved_path = resolve_story_path(file_path)
-    # Get timeline using map-reduce method
-    timeline = map_reduce_timeline_function(resolved_path)
-    
-    # Validate and improve the timeline
-    validated_timeline = validate_timeline_answer(timeline)
-    
-    # Save to file
-    output_file = save_timeline_to_file(validated_timeline, resolved_path, "map_reduce")
-    
-    return f"Timeline created using Map-Reduce method and saved to {output_file}:\n\n{validated_timeline}"
+    return build_map_reduce_timeline(resolved_path)
 
 @tool
 def refine_timeline(file_path: str) -> str:
@@ -106,16 +125,38 @@ def refine_timeline(file_path: str) -> str:
     """
     # Resolve file path
     resolved_path = resolve_story_path(file_path)
-    # Get timeline using refine method
-    timeline = refine_timeline_function(resolved_path)
-    
-    # Validate and improve the timeline
-    validated_timeline = validate_timeline_answer(timeline)
+    return build_refine_timeline(resolved_path)
+
+@tool
+def create_timelines(file_path: str) -> str:
+    """
+    Create BOTH timeline summaries (Map-Reduce and Refine) at the same time and save each to its own file.
     
-    # Save to file
-    output_file = save_timeline_to_file(validated_timeline, resolved_path, "refine")
+    Args:
+        file_path: Path to the text file to summarize
+        
+    Returns:
+        The Map-Reduce timeline followed by the Refine timeline
+    """
+    # Resolve file path
+    resolved_path = resolve_story_path(file_path)
     
-    return f"Timeline created using Refine method and saved to {output_file}:\n\n{validated_timeline}"
+    # Both pipelines spend their time waiting on the LLM, so they run side by side
+    start = time.perf_counter()
+    builders = {"Map-Reduce": build_map_reduce_timeline, "Refine": build_refine_timeline}
+    with ThreadPoolExecutor(max_workers=len(builders)) as executor:
+        futures = {method: executor.submit(builder, resolved_path) for method, builder in builders.items()}
+    
+    results = []
+    for method, future in futures.items():
+        try:
+            results.append(future.result())
+        except Exception as e:
+            # One failed method still leaves the other timeline usable
+            results.append(f"Error creating {method} timeline: {str(e)}")
+    
+    print(f"⏱️ Both timelines created in {time.perf_counter() - start:.1f}s")
+    return "\n\n".join(results)
 
 def validate_timeline_answer(answer):
     """Validate and improve timeline answer precision"""
@@ -168,7 +209,7 @@ def validate_timeline_answer(answer):
 
 def get_timeline_tools():
     """Get all timeline summarization tools for use with agents"""
-    return [map_reduce_timeline, refine_timeline]
+    return [create_timelines, map_reduce_timeline, refine_timeline]
 
 # Example usage
 if __name__ == "__main__":
@@ -192,4 +233,9 @@ if __name__ == "__main__":
     # Test refine timeline
     print("\n2. Refine Timeline:")
     result2 = refine_timeline(test_file)
-    print(result2) 
\ No newline at end of file
+    print(result2)
+    
+    # Test both timelines at once
+    print("\n3. Both Timelines Concurrently:")
+    result3 = create_timelines.invoke(test_file)
+    print(result3) 
\ No newline at end of file
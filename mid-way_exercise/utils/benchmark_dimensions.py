@@ -0,0 +1,153 @@
+"""
+Benchmark for Reduced-Dimension Story Collections
+
+Compares the full-dimension story collection with truncated and PCA-projected
+copies of it. For each setting it reports:
+- Index size on disk
+- Median query latency
+- recall@k against the full-dimension results
+
+Run from the utils folder after data_loader.py has built the full collection.
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+import chromadb
+
+# Add the project root to the path so the shared helpers can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.embedding_backends import get_backend_for_collection
+from utils.projection import EmbeddingProjection
+
+TEST_QUESTIONS = [
+    "What time did the attack start?",
+    "Who was the main suspect?",
+    "What was the name of the suspicious file?",
+    "What happened at 4:55 PM?",
+    "Who were in the emergency call?",
+    "Which VPN server was used?",
+    "When was the incident reported to legal?",
+    "What did the security team find in the logs?"
+]
+
+def directory_size(path):
+    """Total size of all files under path in bytes"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def build_index(directory, ids, documents, embeddings):
+    """Build a throwaway Chroma collection holding the given vectors"""
+    client = chromadb.PersistentClient(path=directory)
+    collection = client.create_collection(name="benchmark")
+    for start in range(0, len(ids), 1000):
+        collection.add(
+            ids=ids[start:start + 1000],
+            documents=documents[start:start + 1000],
+            embeddings=embeddings[start:start + 1000]
+        )
+    return collection
+
+def run_queries(collection, query_embeddings, k, repeats):
+    """Query every question and return (top-k ids per question, median latency in ms)"""
+    latencies = []
+    top_ids = []
+    for query_embedding in query_embeddings:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results = collection.query(query_embeddings=[query_embedding], n_results=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        top_ids.append(results['ids'][0])
+    return top_ids, statistics.median(latencies)
+
+def recall_at_k(baseline_ids, candidate_ids):
+    """Average overlap between the candidate and baseline top-k lists"""
+    scores = [
+        len(set(base) & set(candidate)) / len(base)
+        for base, candidate in zip(baseline_ids, candidate_ids) if base
+    ]
+    return sum(scores) / len(scores) if scores else 0.0
+
+def benchmark(chroma_path, collection_name, settings, k=5, repeats=20):
+    """
+    Benchmark each (method, dimensions) setting against the full-dimension baseline.
+
+    Args:
+        chroma_path: ChromaDB directory holding the full-dimension collection
+        collection_name: Name of that collection
+        settings: List of (method, dimensions) pairs
+        k: Number of results per query
+        repeats: Queries per question for the latency measurement
+
+    Returns:
+        List of result dicts, baseline first
+    """
+    source = chromadb.PersistentClient(path=chroma_path).get_collection(name=collection_name)
+    if (source.metadata or {}).get("embedding_dimensions"):
+        raise ValueError(f"{collection_name} is already reduced; benchmark against a full-dimension collection")
+
+    data = source.get(include=["embeddings", "documents"])
+    ids, documents = data['ids'], data['documents']
+    embeddings = [list(e) for e in data['embeddings']]
+    k = min(k, len(ids))
+
+    backend = get_backend_for_collection(source)
+    question_embeddings = backend.embed(TEST_QUESTIONS)
+
+    print(f"📊 Benchmarking {len(ids)} chunks, {len(TEST_QUESTIONS)} questions, k={k}")
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="dimension_benchmark_")
+    try:
+        baseline_dir = os.path.join(work_dir, "full")
+        baseline = build_index(baseline_dir, ids, documents, embeddings)
+        baseline_ids, baseline_latency = run_queries(baseline, question_embeddings, k, repeats)
+        results.append({
+            "setting": f"full ({len(embeddings[0])})",
+            "size_mb": directory_size(baseline_dir) / 1e6,
+            "latency_ms": baseline_latency,
+            "recall": 1.0
+        })
+
+        for method, dimensions in settings:
+            projection = EmbeddingProjection(dimensions, method).fit(embeddings)
+            directory = os.path.join(work_dir, f"{method}_{dimensions}")
+            index = build_index(directory, ids, documents, projection.apply(embeddings))
+            top_ids, latency = run_queries(index, projection.apply(question_embeddings), k, repeats)
+            results.append({
+                "setting": f"{method} ({dimensions})",
+                "size_mb": directory_size(directory) / 1e6,
+                "latency_ms": latency,
+                "recall": recall_at_k(baseline_ids, top_ids)
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'Setting':<18}{'Size (MB)':>12}{'Latency (ms)':>15}{f'Recall@{k}':>12}")
+    print("-" * 57)
+    for result in results:
+        print(f"{result['setting']:<18}{result['size_mb']:>12.2f}"
+              f"{result['latency_ms']:>15.3f}{result['recall']:>12.3f}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reduced-dimension story collections")
+    parser.add_argument("--chroma-path", default="./chroma_db", help="ChromaDB directory")
+    parser.add_argument("--collection", default="cybersecurity-story", help="Full-dimension collection")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 512, 1024],
+                        help="Reduced dimensions to test")
+    parser.add_argument("--k", type=int, default=5, help="Results per query for recall@k")
+    args = parser.parse_args()
+
+    settings = [(method, dimensions) for method in ["truncate", "pca"] for dimensions in args.dimensions]
+    benchmark(args.chroma_path, args.collection, settings, k=args.k)
+
+if __name__ == "__main__":
+    main()
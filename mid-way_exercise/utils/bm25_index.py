@@ -0,0 +1,227 @@
+"""
+BM25 Keyword Index
+
+This file contains an inverted index with BM25 scoring over all story chunks:
+- Tokens keep identifiers like logi_loader.dll, jmalik or corp-vpn3 intact,
+  and also index their parts (logi, loader, dll) for partial matches
+- Built at ingest time, from the chunks as they are uploaded or by paging
+  through the collection, so all documents are never held in memory at once
+- Incremental syncs only add the new chunks and remove the deleted ones
+- Saved as JSON next to the Chroma database and loaded by the Q&A tools
+"""
+
+import os
+import re
+import json
+import math
+from collections import Counter
+
+# Documents read from the collection per page when the index is rebuilt
+BM25_PAGE_SIZE = int(os.getenv("BM25_PAGE_SIZE", "1000"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-@][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'for', 'from',
+    'had', 'has', 'have', 'he', 'her', 'his', 'how', 'i', 'in', 'is', 'it', 'its',
+    'of', 'on', 'or', 'she', 'that', 'the', 'their', 'they', 'this', 'to', 'was',
+    'we', 'were', 'what', 'when', 'where', 'which', 'who', 'why', 'with'
+}
+
+def tokenize(text):
+    """Split text into lowercase terms, keeping compound identifiers and their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS:
+            terms.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+class BM25Index:
+    def __init__(self, ids, doc_lengths, postings, k1=1.5, b=0.75):
+        self.ids = ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.positions = {chunk_id: doc_index for doc_index, chunk_id in enumerate(ids)}
+        # Statistics are computed on the first search after the index changes
+        self.idf = None
+        self.avg_length = 0.0
+
+    @classmethod
+    def from_documents(cls, ids, documents):
+        """Build the index from chunk ids and texts"""
+        index = cls([], [], {})
+        index.add(ids, documents)
+        return index
+
+    def add(self, ids, documents):
+        """Add chunks that are not in the index yet"""
+        for chunk_id, document in zip(ids, documents):
+            if chunk_id in self.positions:
+                continue
+            doc_index = len(self.ids)
+            self.positions[chunk_id] = doc_index
+            self.ids.append(chunk_id)
+            terms = tokenize(document or "")
+            self.doc_lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                self.postings.setdefault(term, {})[doc_index] = count
+        self.idf = None
+
+    def remove(self, ids):
+        """Remove chunks and renumber the ones after them"""
+        removed = {self.positions[chunk_id] for chunk_id in ids if chunk_id in self.positions}
+        if not removed:
+            return
+        renumbered = {}
+        kept_ids = []
+        kept_lengths = []
+        for doc_index, chunk_id in enumerate(self.ids):
+            if doc_index not in removed:
+                renumbered[doc_index] = len(kept_ids)
+                kept_ids.append(chunk_id)
+                kept_lengths.append(self.doc_lengths[doc_index])
+
+        postings = {}
+        for term, docs in self.postings.items():
+            kept = {renumbered[doc_index]: count for doc_index, count in docs.items() if doc_index in renumbered}
+            if kept:
+                postings[term] = kept
+
+        self.ids = kept_ids
+        self.doc_lengths = kept_lengths
+        self.postings = postings
+        self.positions = {chunk_id: doc_index for doc_index, chunk_id in enumerate(kept_ids)}
+        self.idf = None
+
+    def compute_statistics(self):
+        """Compute the average document length and the idf of every term"""
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        n_docs = len(self.ids)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query, n_results=10):
+        """
+        Score chunks against the query terms.
+
+        Returns:
+            List of (chunk_id, score) pairs, best first
+        """
+        if self.idf is None:
+            self.compute_statistics()
+
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc_index, count in docs.items():
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / (self.avg_length or 1.0)
+                term_score = idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+                scores[doc_index] = scores.get(doc_index, 0.0) + term_score
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [(self.ids[doc_index], score) for doc_index, score in best]
+
+    def to_dict(self):
+        return {"ids": self.ids, "doc_lengths": self.doc_lengths, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data):
+        # JSON turns the integer document indexes into strings
+        postings = {
+            term: {int(doc_index): count for doc_index, count in docs.items()}
+            for term, docs in data["postings"].items()
+        }
+        return cls(data["ids"], data["doc_lengths"], postings)
+
+def bm25_index_path(chroma_path, collection_name):
+    """Where the BM25 index of a collection is stored"""
+    return os.path.join(chroma_path, f"{collection_name}_bm25.json")
+
+def write_bm25_index(index, chroma_path, collection_name):
+    """Save a BM25 index to disk"""
+    with open(bm25_index_path(chroma_path, collection_name), 'w', encoding='utf-8') as f:
+        json.dump(index.to_dict(), f)
+    print(f"🔤 Saved BM25 index with {len(index.postings)} terms over {len(index.ids)} chunks")
+
+def save_bm25_index(collection, chroma_path, page_size=BM25_PAGE_SIZE):
+    """Rebuild the BM25 index from every chunk in a collection, one page of documents at a time"""
+    index = BM25Index([], [], {})
+    offset = 0
+    while True:
+        page = collection.get(include=["documents"], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        index.add(page['ids'], page['documents'])
+        offset += len(page['ids'])
+    write_bm25_index(index, chroma_path, collection.name)
+    return index
+
+def save_updated_bm25_index(collection, chroma_path, index):
+    """
+    Save an index that was updated chunk by chunk during ingest.
+
+    The index is rebuilt from the collection instead if its chunks do not
+    match the collection's, e.g. when it was updated from a stale saved index.
+    """
+    if set(index.ids) != set(collection.get(include=[])['ids']):
+        print("🔤 BM25 index does not match the collection, rebuilding it")
+        return save_bm25_index(collection, chroma_path)
+    write_bm25_index(index, chroma_path, collection.name)
+    return index
+
+def update_bm25_index(collection, chroma_path, added_ids=(), added_documents=(), removed_ids=()):
+    """
+    Add and remove chunks in the saved BM25 index without re-reading the collection.
+
+    Args:
+        collection: Chroma collection the chunks were added to or deleted from
+        chroma_path: ChromaDB directory
+        added_ids: Ids of the new chunks
+        added_documents: Texts of the new chunks
+        removed_ids: Ids of the deleted chunks
+
+    Returns:
+        The updated index
+    """
+    index = load_bm25_index(chroma_path, collection.name)
+    if index is None:
+        return save_bm25_index(collection, chroma_path)
+    index.remove(removed_ids)
+    index.add(added_ids, added_documents)
+    return save_updated_bm25_index(collection, chroma_path, index)
+
+def load_bm25_index(chroma_path, collection_name):
+    """Load the BM25 index of a collection, or None if none was built"""
+    path = bm25_index_path(chroma_path, collection_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return BM25Index.from_dict(json.load(f))
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """
+    Fuse several ranked id lists with reciprocal-rank fusion.
+
+    Args:
+        ranked_lists: Lists of chunk ids, each best first
+        k: Damping constant (60 is the usual choice)
+
+    Returns:
+        List of (chunk_id, fused_score), best first
+    """
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, chunk_id in enumerate(ranked):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,219 @@
+"""
+Bulk Ingestion for Many Story Files
+
+This file loads a whole directory (or glob) of incident write-ups into ChromaDB:
+- Files are parsed and chunked in a process pool
+- Chunks flow through a bounded queue to an uploader thread that embeds and uploads them
+- Each chunk records its source path and document title
+- Chunks of an earlier version of a re-ingested file are deleted
+- Throughput is reported in files/s and chunks/s
+"""
+
+import os
+import sys
+import glob
+import time
+import queue
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Add the project root to the path so the loader can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.data_loader import StoryDataLoader
+from utils.time_index import save_time_index
+from utils.bm25_index import BM25Index, load_bm25_index, save_updated_bm25_index
+from utils.quantized_index import remove_quantized_index
+
+_worker_loader = None
+
+def find_story_files(path_or_glob):
+    """Expand a directory or glob pattern into a sorted list of text files"""
+    if os.path.isdir(path_or_glob):
+        pattern = os.path.join(path_or_glob, "**", "*.txt")
+    else:
+        pattern = path_or_glob
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+def title_from_path(file_path):
+    """Turn a file name like The_Day_Everything_Slowed_Down.txt into a title"""
+    return Path(file_path).stem.replace('_', ' ').replace('-', ' ').strip()
+
+def chunk_file(file_path, chunk_size=400, chunk_overlap=80):
+    """
+    Parse and chunk one file. Runs inside a worker process.
+
+    Args:
+        file_path: Path to the story file
+        chunk_size: Chunk size in characters
+        chunk_overlap: Overlap between chunks in characters
+
+    Returns:
+        (file_path, chunks) with content-hash ids unique to this document
+    """
+    global _worker_loader
+    if _worker_loader is None:
+        # One tokenizer per worker process, no API or database clients
+        _worker_loader = StoryDataLoader(connect=False)
+
+    source = os.path.abspath(file_path)
+    chunks = list(_worker_loader.iter_chunks(
+        file_path,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        document_title=title_from_path(file_path),
+        source=source
+    ))
+
+    document_key = hashlib.sha256(source.encode('utf-8')).hexdigest()[:8]
+    _worker_loader.assign_content_ids(chunks, prefix=f"doc_{document_key}")
+    return file_path, chunks
+
+def bulk_ingest(path_or_glob, collection_name="incident-stories", chroma_path="./chroma_db",
+                processes=None, batch_size=256, max_pending_batches=4):
+    """
+    Ingest every matching file into one Chroma collection.
+
+    Args:
+        path_or_glob: Directory or glob pattern of story files
+        collection_name: Chroma collection to upload into
+        chroma_path: ChromaDB directory
+        processes: Number of chunking processes (defaults to the CPU count)
+        batch_size: Number of chunks per embedding/upload batch
+        max_pending_batches: Batches allowed to wait for upload before chunking pauses
+
+    Returns:
+        Dict with file, chunk and throughput counts
+    """
+    files = find_story_files(path_or_glob)
+    if not files:
+        print(f"❌ No files found for: {path_or_glob}")
+        return {"files": 0, "chunks": 0, "embedded": 0}
+
+    print(f"📂 Found {len(files)} files to ingest into '{collection_name}'")
+
+    loader = StoryDataLoader(collection_name=collection_name, chroma_path=chroma_path)
+    collection = loader.setup_chroma()
+
+    # Bounded hand-off between chunking and the embed/upload stage
+    upload_queue = queue.Queue(maxsize=max_pending_batches)
+    stats = {"chunks": 0, "embedded": 0}
+    upload_errors = []
+
+    # The keyword index is updated batch by batch, so no document is read back from Chroma
+    bm25_index = load_bm25_index(chroma_path, collection_name) or BM25Index([], [], {})
+
+    def uploader():
+        while True:
+            batch = upload_queue.get()
+            if batch is None:
+                break
+            try:
+                stats["embedded"] += loader.upload_new_chunks(collection, batch)
+                stats["chunks"] += len(batch)
+                bm25_index.add([chunk['id'] for chunk in batch], [chunk['text'] for chunk in batch])
+            except Exception as e:
+                upload_errors.append(e)
+                print(f"❌ Error uploading batch: {e}")
+
+    upload_thread = threading.Thread(target=uploader, daemon=True)
+    upload_thread.start()
+
+    start_time = time.perf_counter()
+    files_done = 0
+    batch = []
+    orphan_ids = []
+
+    processes = processes or os.cpu_count() or 1
+    pending_files = iter(files)
+    in_flight = set()
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # Keep a bounded number of files in flight so chunked results cannot pile up
+        while True:
+            while len(in_flight) < 2 * processes:
+                file_path = next(pending_files, None)
+                if file_path is None:
+                    break
+                in_flight.add(executor.submit(chunk_file, file_path))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    file_path, chunks = future.result()
+                except Exception as e:
+                    print(f"❌ Error chunking file: {e}")
+                    continue
+
+                files_done += 1
+                # Chunks this file had before that its current version no longer has
+                chunk_ids = {chunk['id'] for chunk in chunks}
+                previous_ids = collection.get(where={"source": os.path.abspath(file_path)}, include=[])['ids']
+                orphan_ids.extend(chunk_id for chunk_id in previous_ids if chunk_id not in chunk_ids)
+
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= batch_size:
+                        upload_queue.put(batch)
+                        batch = []
+
+                if files_done % 10 == 0 or files_done == len(files):
+                    print(f"✂️ Chunked {files_done}/{len(files)} files")
+
+    if batch:
+        upload_queue.put(batch)
+    upload_queue.put(None)
+    upload_thread.join()
+
+    # Old chunks are only dropped once every new chunk is uploaded, so a failed upload loses nothing
+    if orphan_ids and upload_errors:
+        print(f"⚠️ Kept {len(orphan_ids)} chunks of earlier file versions because some uploads failed")
+        orphan_ids = []
+    if orphan_ids:
+        collection.delete(ids=orphan_ids)
+        bm25_index.remove(orphan_ids)
+    save_time_index(collection, chroma_path)
+    save_updated_bm25_index(collection, chroma_path, bm25_index)
+    remove_quantized_index(chroma_path, collection.name)
+
+    elapsed = time.perf_counter() - start_time
+    result = {
+        "files": files_done,
+        "chunks": stats["chunks"],
+        "embedded": stats["embedded"],
+        "deleted": len(orphan_ids),
+        "errors": len(upload_errors),
+        "seconds": elapsed,
+        "files_per_second": files_done / elapsed if elapsed else 0.0,
+        "chunks_per_second": stats["chunks"] / elapsed if elapsed else 0.0
+    }
+
+    print(f"\n✅ Ingested {result['files']} files, {result['chunks']} chunks "
+          f"({result['embedded']} newly embedded, {result['deleted']} outdated deleted) in {elapsed:.1f}s")
+    print(f"⚡ Throughput: {result['files_per_second']:.2f} files/s, "
+          f"{result['chunks_per_second']:.1f} chunks/s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of story files into ChromaDB")
+    parser.add_argument("path", help="Directory or glob pattern of .txt files")
+    parser.add_argument("--collection", default="incident-stories", help="Chroma collection name")
+    parser.add_argument("--chroma-path", default="./chroma_db", help="ChromaDB directory")
+    parser.add_argument("--processes", type=int, default=None, help="Number of chunking processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per upload batch")
+    args = parser.parse_args()
+
+    bulk_ingest(
+        args.path,
+        collection_name=args.collection,
+        chroma_path=args.chroma_path,
+        processes=args.processes,
+        batch_size=args.batch_size
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,52 @@
 import os
+import sys
+import argparse
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from dotenv import load_dotenv
 import chromadb
 from openai import OpenAI
-import re
 import tiktoken
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+# Add the project root to the path so the shared embedding cache can be imported
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.embedding_cache import cached_embeddings, get_embedding_cache
+from utils.embedding_backends import get_embedding_backend
+from utils.projection import EmbeddingProjection, projection_path
+from utils.time_index import MARKER_TIME_PATTERN, save_time_index
+from utils.bm25_index import BM25Index, load_bm25_index, save_bm25_index, save_updated_bm25_index, update_bm25_index
+from utils.quantized_index import remove_quantized_index
+
 load_dotenv()
 
+EMBEDDING_MODEL = "text-embedding-3-large"
+TIME_PATTERN = MARKER_TIME_PATTERN
+
 class StoryDataLoader:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-        self.collection_name = "cybersecurity-story"
-        self.tokenizer = tiktoken.encoding_for_model("text-embedding-3-large")
+    def __init__(self, max_batch_tokens=50000, max_batch_size=512, max_workers=4, max_retries=3,
+                 collection_name="cybersecurity-story", chroma_path="./chroma_db", connect=True,
+                 embedding_backend=None, embedding_dimensions=None, projection="truncate"):
+        # connect=False skips the API and database clients (used by chunking worker processes)
+        if connect:
+            self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+            self.embedding_backend = get_embedding_backend(embedding_backend)
+            # Only the OpenAI backend needs an API key, the local one runs offline
+            self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if self.embedding_backend.name == "openai" else None
+        self.collection_name = collection_name
+        self.chroma_path = chroma_path
+        
+        # Optional reduced-dimension storage (None keeps the full model dimension)
+        self.projection = EmbeddingProjection(embedding_dimensions, projection) if embedding_dimensions else None
+        self.tokenizer = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+        
+        # Embedding request limits (OpenAI allows up to 2048 inputs / 300k tokens per request)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
     
     def parse_story_file(self, file_path):
         """Parse story file and extract the full text"""
@@ -24,78 +57,296 @@ class StoryDataLoader:
     def estimate_tokens(self, text):
         return len(self.tokenizer.encode(text))
     
-    def create_chunks(self, story_text, chunk_size=400, chunk_overlap=80):
-        """Create semantic chunks using RecursiveCharacterTextSplitter"""
+    def iter_story_segments(self, file_path, block_size=1024 * 1024):
+        """
+        Read a story file incrementally and yield paragraph-aligned segments.
         
-        # Initialize the text splitter
-        text_splitter = RecursiveCharacterTextSplitter(
+        Blocks of block_size characters are read and cut at the last paragraph
+        break (or line break) so no segment splits a paragraph; the remainder is
+        carried into the next segment. Memory stays around one block.
+        
+        Args:
+            file_path: Path to the story file
+            block_size: Number of characters to read at a time
+            
+        Yields:
+            Text segments in file order
+        """
+        buffer = ""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                buffer += block
+                
+                cut = buffer.rfind("\n\n")
+                if cut == -1:
+                    cut = buffer.rfind("\n")
+                if cut <= 0:
+                    # No break yet, keep reading unless the buffer gets too large
+                    if len(buffer) < 4 * block_size:
+                        continue
+                    cut = len(buffer)
+                
+                yield buffer[:cut]
+                buffer = buffer[cut:]
+        
+        if buffer.strip():
+            yield buffer
+    
+    def make_text_splitter(self, chunk_size=400, chunk_overlap=80):
+        """Create the text splitter used for story chunks"""
+        return RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
             separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
         )
+    
+    def build_chunk(self, i, chunk_text, document_title='The Day Everything Slowed Down',
+                    source='cybersecurity_incident_story'):
+        """Build one chunk dict with its metadata, or None if the text is empty"""
+        # Clean up the chunk text
+        cleaned_chunk = chunk_text.strip()
+        if not cleaned_chunk:
+            return None
+            
+        # Estimate tokens for this chunk
+        token_count = self.estimate_tokens(cleaned_chunk)
+        
+        # Extract time information if present
+        times_in_chunk = TIME_PATTERN.findall(cleaned_chunk)
+        
+        return {
+            'id': f"story_chunk_{i}",
+            'text': cleaned_chunk,
+            'metadata': {
+                'type': 'story_chunk',
+                'chunk_id': i,
+                'length': len(cleaned_chunk),
+                'token_estimate': token_count,
+                'has_time_marker': len(times_in_chunk) > 0,
+                'times_found': ', '.join(times_in_chunk) if times_in_chunk else '',
+                'document_title': document_title,
+                'source': source
+            }
+        }
+    
+    def create_chunks(self, story_text, chunk_size=400, chunk_overlap=80):
+        """Create semantic chunks using RecursiveCharacterTextSplitter"""
+        
+        # Initialize the text splitter
+        text_splitter = self.make_text_splitter(chunk_size, chunk_overlap)
         
         # Split the text into chunks
         text_chunks = text_splitter.split_text(story_text)
         
         chunks = []
         for i, chunk_text in enumerate(text_chunks):
-            # Clean up the chunk text
-            cleaned_chunk = chunk_text.strip()
-            if not cleaned_chunk:
-                continue
-                
-            # Estimate tokens for this chunk
-            token_count = self.estimate_tokens(cleaned_chunk)
-            
-            # Extract time information if present
-            time_pattern = r'\b(?:At\s+)?\d{1,2}:\d{2}\s*(?:AM|PM)\b'
-            times_in_chunk = re.findall(time_pattern, cleaned_chunk)
-            
-            chunks.append({
-                'id': f"story_chunk_{i}",
-                'text': cleaned_chunk,
-                'metadata': {
-                    'type': 'story_chunk',
-                    'chunk_id': i,
-                    'length': len(cleaned_chunk),
-                    'token_estimate': token_count,
-                    'has_time_marker': len(times_in_chunk) > 0,
-                    'times_found': ', '.join(times_in_chunk) if times_in_chunk else '',
-                    'document_title': 'The Day Everything Slowed Down',
-                    'source': 'cybersecurity_incident_story'
-                }
-            })
+            chunk = self.build_chunk(i, chunk_text)
+            if chunk:
+                chunks.append(chunk)
+        
+        return chunks
+    
+    def iter_chunks(self, file_path, chunk_size=400, chunk_overlap=80, block_size=1024 * 1024,
+                    **document_metadata):
+        """
+        Stream chunks from a story file without loading it all into memory.
+        
+        Uses the same splitter, overlap and metadata as create_chunks. Segments
+        are cut at paragraph breaks, which the splitter prefers anyway, so the
+        chunks match create_chunks except where a chunk would have merged
+        paragraphs across a segment boundary.
         
+        Yields:
+            Chunk dicts with positional ids across the whole file
+        """
+        text_splitter = self.make_text_splitter(chunk_size, chunk_overlap)
+        i = 0
+        for segment in self.iter_story_segments(file_path, block_size):
+            for chunk_text in text_splitter.split_text(segment):
+                chunk = self.build_chunk(i, chunk_text, **document_metadata)
+                i += 1
+                if chunk:
+                    yield chunk
+    
+    def assign_content_ids(self, chunks, seen=None, prefix="story_chunk"):
+        """
+        Replace positional ids with stable content-hash ids.
+        
+        The id only depends on the chunk text, so editing one paragraph of the
+        story only changes the ids of the chunks that paragraph touches.
+        Identical chunk texts get an occurrence suffix to keep ids unique.
+        
+        Args:
+            chunks: Chunks to update in place
+            seen: Occurrence counts shared across calls when ids are assigned batch by batch
+            prefix: Id prefix, used to keep ids of different documents apart
+        """
+        if seen is None:
+            seen = {}
+        for chunk in chunks:
+            digest = hashlib.sha256(chunk['text'].encode('utf-8')).hexdigest()[:16]
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            chunk_id = f"{prefix}_{digest}" if occurrence == 0 else f"{prefix}_{digest}_{occurrence}"
+            chunk['id'] = chunk_id
+            chunk['metadata']['content_hash'] = digest
         return chunks
     
+    def make_embedding_batches(self, texts):
+        """
+        Pack texts into batches that stay under the token and input budgets.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            List of batches, each a list of indexes into texts
+        """
+        batches = []
+        current_batch = []
+        current_tokens = 0
+        
+        for i, text in enumerate(texts):
+            token_count = self.estimate_tokens(text)
+            batch_full = (
+                current_tokens + token_count > self.max_batch_tokens
+                or len(current_batch) >= self.max_batch_size
+            )
+            if current_batch and batch_full:
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(i)
+            current_tokens += token_count
+        
+        if current_batch:
+            batches.append(current_batch)
+        
+        return batches
+    
+    def embed_batch(self, batch_texts):
+        """Embed one batch, retrying it on its own with backoff if it fails"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.openai_client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=batch_texts
+                )
+                # The API returns one item per input with its position in `index`
+                ordered = sorted(response.data, key=lambda e: e.index)
+                return [e.embedding for e in ordered]
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                wait_seconds = 2 ** attempt
+                print(f"⚠️ Embedding batch of {len(batch_texts)} failed ({e}), retrying in {wait_seconds}s...")
+                time.sleep(wait_seconds)
+    
     def get_embeddings(self, texts):
-        """Batch embed using OpenAI"""
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-large",
-            input=texts
-        )
-        return [e.embedding for e in response.data]
+        """Embed texts with the selected backend through the shared on-disk embedding cache"""
+        if self.embedding_backend.name == "openai":
+            return cached_embeddings(texts, EMBEDDING_MODEL, self.embed_in_batches)
+        return self.embedding_backend.embed(texts)
+    
+    def get_storage_embeddings(self, texts):
+        """
+        Embed texts and apply the reduced-dimension projection, if one is configured.
+        
+        A PCA projection that has not been fitted yet is fitted on the first
+        texts embedded and saved next to the Chroma database.
+        """
+        embeddings = self.get_embeddings(texts)
+        if not self.projection or not embeddings:
+            return embeddings
+        
+        if not self.projection.is_fitted:
+            print(f"📐 Fitting PCA projection to {self.projection.dimensions} dims on {len(embeddings)} embeddings")
+            self.projection.fit(embeddings)
+            self.projection.save(projection_path(self.chroma_path, self.collection_name))
+        return self.projection.apply(embeddings)
+    
+    def embed_in_batches(self, texts):
+        """
+        Batch embed using OpenAI.
+        
+        Texts are packed into token-budgeted batches which are sent concurrently
+        by a bounded worker pool. The result keeps the same order as texts.
+        """
+        if not texts:
+            return []
+        
+        batches = self.make_embedding_batches(texts)
+        embeddings = [None] * len(texts)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batch_results = executor.map(
+                lambda batch: self.embed_batch([texts[i] for i in batch]),
+                batches
+            )
+            for batch, batch_embeddings in zip(batches, batch_results):
+                for i, embedding in zip(batch, batch_embeddings):
+                    embeddings[i] = embedding
+        
+        if len(batches) > 1:
+            print(f"🧮 Embedded {len(texts)} texts in {len(batches)} batches")
+        return embeddings
     
     def setup_chroma(self):
         """Initialize Chroma collection"""
+        embedding_model = self.embedding_backend.model
         try:
             collection = self.chroma_client.get_collection(name=self.collection_name)
             print(f"Using existing Chroma collection: {self.collection_name}")
         except:
+            metadata = {
+                "description": "Cybersecurity story text data",
+                "embedding_model": embedding_model
+            }
+            if self.projection:
+                metadata["embedding_dimensions"] = self.projection.dimensions
+                metadata["projection"] = self.projection.method
             collection = self.chroma_client.create_collection(
                 name=self.collection_name,
-                metadata={"description": "Cybersecurity story text data"}
+                metadata=metadata
             )
             print(f"Created Chroma collection: {self.collection_name}")
         
+        stored = collection.metadata or {}
+        stored_model = stored.get("embedding_model")
+        if stored_model and stored_model != embedding_model:
+            raise ValueError(
+                f"Collection {self.collection_name} was built with {stored_model}, "
+                f"not {embedding_model}. Use another collection or reset it first."
+            )
+        
+        stored_dimensions = stored.get("embedding_dimensions")
+        wanted_dimensions = self.projection.dimensions if self.projection else None
+        wanted_method = self.projection.method if self.projection else None
+        if stored_dimensions != wanted_dimensions or (wanted_method and stored.get("projection") != wanted_method):
+            raise ValueError(
+                f"Collection {self.collection_name} stores {stored_dimensions or 'full'}-dim "
+                f"{stored.get('projection', '')} vectors, not {wanted_dimensions or 'full'}-dim "
+                f"{wanted_method or ''} vectors. Use another collection or reset it first."
+            )
+        
+        if self.projection and self.projection.method == "pca" and not self.projection.is_fitted:
+            # Reuse the components the collection was built with
+            self.projection = EmbeddingProjection.load(
+                projection_path(self.chroma_path, self.collection_name),
+                self.projection.dimensions, "pca"
+            )
+        
         return collection
     
     def upload_to_chroma(self, chunks):
         """Upload chunks to Chroma with embeddings"""
         collection = self.setup_chroma()
         texts = [chunk['text'] for chunk in chunks]
-        embeddings = self.get_embeddings(texts)
+        embeddings = self.get_storage_embeddings(texts)
         ids = [chunk['id'] for chunk in chunks]
         documents = [chunk['text'] for chunk in chunks]
         metadatas = [chunk['metadata'] for chunk in chunks]
@@ -108,13 +359,191 @@ class StoryDataLoader:
         )
 
         print(f"✅ Uploaded {len(chunks)} chunks to Chroma")
+        save_time_index(collection, self.chroma_path)
+        save_bm25_index(collection, self.chroma_path)
+        remove_quantized_index(self.chroma_path, collection.name)
+        return collection
+    
+    def sync_to_chroma(self, chunks):
+        """
+        Incrementally sync chunks to Chroma using content-hash ids.
+        
+        Only chunks whose text is new get embedded. Chunks that are still present
+        but moved keep their embedding and only get their metadata refreshed, and
+        chunks that no longer exist in the story are deleted.
+        
+        Args:
+            chunks: Chunks from create_chunks
+            
+        Returns:
+            The Chroma collection
+        """
+        collection = self.setup_chroma()
+        chunks = self.assign_content_ids(chunks)
+        
+        existing = collection.get(include=["metadatas"])
+        existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+        
+        wanted_ids = {chunk['id'] for chunk in chunks}
+        new_chunks = [chunk for chunk in chunks if chunk['id'] not in existing_metadata]
+        moved_chunks = [
+            chunk for chunk in chunks
+            if chunk['id'] in existing_metadata and existing_metadata[chunk['id']] != chunk['metadata']
+        ]
+        orphan_ids = [chunk_id for chunk_id in existing_metadata if chunk_id not in wanted_ids]
+        
+        if new_chunks:
+            texts = [chunk['text'] for chunk in new_chunks]
+            collection.add(
+                ids=[chunk['id'] for chunk in new_chunks],
+                embeddings=self.get_storage_embeddings(texts),
+                documents=texts,
+                metadatas=[chunk['metadata'] for chunk in new_chunks]
+            )
+        
+        if moved_chunks:
+            collection.update(
+                ids=[chunk['id'] for chunk in moved_chunks],
+                metadatas=[chunk['metadata'] for chunk in moved_chunks]
+            )
+        
+        if orphan_ids:
+            collection.delete(ids=orphan_ids)
+        
+        unchanged = len(chunks) - len(new_chunks)
+        print(f"✅ Synced {len(chunks)} chunks to Chroma: "
+              f"{len(new_chunks)} embedded, {unchanged} reused "
+              f"({len(moved_chunks)} metadata updates), {len(orphan_ids)} deleted")
+        save_time_index(collection, self.chroma_path)
+        # Moved chunks keep their text, so only new and deleted chunks change the keyword index
+        update_bm25_index(
+            collection, self.chroma_path,
+            added_ids=[chunk['id'] for chunk in new_chunks],
+            added_documents=[chunk['text'] for chunk in new_chunks],
+            removed_ids=orphan_ids
+        )
+        remove_quantized_index(self.chroma_path, collection.name)
+        return collection
+
+    def upload_new_chunks(self, collection, chunks):
+        """
+        Add chunks that are not in the collection yet and refresh metadata of the rest.
+        
+        Args:
+            collection: Chroma collection
+            chunks: Chunks with content-hash ids
+            
+        Returns:
+            Number of chunks that were embedded
+        """
+        ids = [chunk['id'] for chunk in chunks]
+        existing_ids = set(collection.get(ids=ids, include=[])['ids'])
+        
+        new_chunks = [chunk for chunk in chunks if chunk['id'] not in existing_ids]
+        old_chunks = [chunk for chunk in chunks if chunk['id'] in existing_ids]
+        if new_chunks:
+            texts = [chunk['text'] for chunk in new_chunks]
+            collection.add(
+                ids=[chunk['id'] for chunk in new_chunks],
+                embeddings=self.get_storage_embeddings(texts),
+                documents=texts,
+                metadatas=[chunk['metadata'] for chunk in new_chunks]
+            )
+        if old_chunks:
+            collection.update(
+                ids=[chunk['id'] for chunk in old_chunks],
+                metadatas=[chunk['metadata'] for chunk in old_chunks]
+            )
+        return len(new_chunks)
+    
+    def stream_to_chroma(self, chunk_iter, batch_size=256, delete_orphans=True):
+        """
+        Upload a stream of chunks to Chroma in fixed-size batches.
+        
+        Chunks get content-hash ids so only chunks that are not already in the
+        collection are embedded. Only one batch of chunks is held in memory;
+        the set of seen ids is kept to delete orphaned chunks at the end.
+        
+        Args:
+            chunk_iter: Iterable of chunks, e.g. from iter_chunks
+            batch_size: Number of chunks per upload batch
+            delete_orphans: Delete chunks in the collection that were not in the stream
+            
+        Returns:
+            The Chroma collection
+        """
+        collection = self.setup_chroma()
+        seen_hashes = {}
+        seen_ids = set()
+        total = 0
+        embedded = 0
+        
+        # The keyword index is updated batch by batch, so no document is read back from Chroma
+        bm25_index = load_bm25_index(self.chroma_path, self.collection_name) or BM25Index([], [], {})
+        
+        def flush(batch):
+            batch = self.assign_content_ids(batch, seen_hashes)
+            seen_ids.update(chunk['id'] for chunk in batch)
+            uploaded = self.upload_new_chunks(collection, batch)
+            bm25_index.add([chunk['id'] for chunk in batch], [chunk['text'] for chunk in batch])
+            return uploaded
+        
+        batch = []
+        for chunk in chunk_iter:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                embedded += flush(batch)
+                total += len(batch)
+                print(f"📤 Streamed {total} chunks...")
+                batch = []
+        if batch:
+            embedded += flush(batch)
+            total += len(batch)
+        
+        deleted = 0
+        if delete_orphans:
+            orphan_ids = [chunk_id for chunk_id in collection.get(include=[])['ids'] if chunk_id not in seen_ids]
+            if orphan_ids:
+                collection.delete(ids=orphan_ids)
+                bm25_index.remove(orphan_ids)
+            deleted = len(orphan_ids)
+        
+        print(f"✅ Streamed {total} chunks to Chroma: {embedded} embedded, {deleted} deleted")
+        save_time_index(collection, self.chroma_path)
+        save_updated_bm25_index(collection, self.chroma_path, bm25_index)
+        remove_quantized_index(self.chroma_path, collection.name)
         return collection
 
 def main():
-    loader = StoryDataLoader()
+    parser = argparse.ArgumentParser(description="Load the story into ChromaDB")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new or changed chunks and delete orphaned ones")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read, chunk and upload the file incrementally with flat memory use")
+    parser.add_argument("--backend", choices=["openai", "local"], default=None,
+                        help="Embedding backend (defaults to EMBEDDING_BACKEND or openai)")
+    parser.add_argument("--dimensions", type=int, default=None,
+                        help="Store reduced-dimension vectors (e.g. 256) instead of the full model dimension")
+    parser.add_argument("--projection", choices=["truncate", "pca"], default="truncate",
+                        help="How to reduce dimensions when --dimensions is set")
+    parser.add_argument("--file", default='../data/The_Day_Everything_Slowed_Down_Unstructured.txt',
+                        help="Story file to load")
+    args = parser.parse_args()
+    
+    loader = StoryDataLoader(
+        embedding_backend=args.backend,
+        embedding_dimensions=args.dimensions,
+        projection=args.projection
+    )
+    
+    if args.stream:
+        print(f"🌊 Streaming {args.file} to Chroma...")
+        loader.stream_to_chroma(loader.iter_chunks(args.file))
+        print("✅ Story data loading complete!")
+        return
     
     print("📂 Parsing story file...")
-    story_text = loader.parse_story_file('../data/The_Day_Everything_Slowed_Down_Unstructured.txt')
+    story_text = loader.parse_story_file(args.file)
     print(f"📏 Story length: {len(story_text)} characters")
     
     print("✂️ Creating chunks...")
@@ -125,8 +554,15 @@ def main():
         print(f"\nChunk {i + 1} (first 200 chars):")
         print(chunk['text'][:200] + "...")
     
-    print("\n📤 Uploading to Chroma...")
-    loader.upload_to_chroma(chunks)
+    if args.incremental:
+        print("\n🔄 Syncing to Chroma (incremental)...")
+        loader.sync_to_chroma(chunks)
+    else:
+        print("\n📤 Uploading to Chroma...")
+        loader.upload_to_chroma(chunks)
+    
+    cache_stats = get_embedding_cache().stats()
+    print(f"💾 Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
     print("✅ Story data loading complete!")
 
 if __name__ == "__main__":
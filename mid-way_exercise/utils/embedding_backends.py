@@ -0,0 +1,153 @@
+"""
+Embedding Backends
+
+This file contains the embedding backends the loader and Q&A tools can select:
+- openai: OpenAI text-embedding-3-large (default)
+- local: sentence-transformers/all-MiniLM-L6-v2 on CPU, for air-gapped runs
+
+Select one with the EMBEDDING_BACKEND environment variable. Both backends go
+through the shared embedding cache, keyed by their model name, and have an
+async aembed for the async Q&A tools.
+"""
+
+import os
+import asyncio
+import threading
+from openai import OpenAI
+from dotenv import load_dotenv
+
+from utils.embedding_cache import acached_embeddings, cached_embeddings
+
+# Load environment variables
+load_dotenv()
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-large"
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+class OpenAIEmbeddingBackend:
+    name = "openai"
+    default_model = OPENAI_EMBEDDING_MODEL
+
+    def __init__(self, model=None):
+        self.model = model or self.default_model
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def embed_uncached(self, texts):
+        """Embed texts in one API request"""
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return [e.embedding for e in sorted(response.data, key=lambda e: e.index)]
+
+    def embed(self, texts):
+        """Embed texts through the shared cache"""
+        return cached_embeddings(texts, self.model, self.embed_uncached)
+
+    async def aembed(self, texts, client):
+        """
+        Embed texts through the shared cache without blocking the event loop.
+
+        Args:
+            texts: Texts to embed
+            client: AsyncOpenAI client whose connection pool the request uses
+        """
+        async def embed_uncached(missing_texts):
+            response = await client.embeddings.create(model=self.model, input=missing_texts)
+            return [e.embedding for e in sorted(response.data, key=lambda e: e.index)]
+        return await acached_embeddings(texts, self.model, embed_uncached)
+
+class LocalEmbeddingBackend:
+    name = "local"
+    default_model = LOCAL_EMBEDDING_MODEL
+
+    # Models are loaded once per process and shared by all backend instances
+    _models = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, model=None, batch_size=None, num_threads=None):
+        self.model = model or self.default_model
+        self.batch_size = batch_size or int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "256"))
+        self.num_threads = num_threads or int(os.getenv("LOCAL_EMBEDDING_THREADS", "0")) or None
+
+    def load_model(self):
+        """Load the sentence-transformers model once per process"""
+        with LocalEmbeddingBackend._models_lock:
+            if self.model not in LocalEmbeddingBackend._models:
+                import torch
+                from sentence_transformers import SentenceTransformer
+
+                if self.num_threads:
+                    torch.set_num_threads(self.num_threads)
+                print(f"📦 Loading local embedding model: {self.model}")
+                LocalEmbeddingBackend._models[self.model] = SentenceTransformer(self.model, device="cpu")
+        return LocalEmbeddingBackend._models[self.model]
+
+    def embed_uncached(self, texts):
+        """
+        Encode texts on CPU in large length-bucketed batches.
+
+        Texts are sorted by length before batching so each padded batch holds
+        texts of similar length, then the results are put back in input order.
+        """
+        model = self.load_model()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = [None] * len(texts)
+
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            vectors = model.encode(
+                [texts[i] for i in bucket],
+                batch_size=len(bucket),
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            for i, vector in zip(bucket, vectors):
+                embeddings[i] = vector.tolist()
+
+        return embeddings
+
+    def embed(self, texts):
+        """Embed texts through the shared cache"""
+        return cached_embeddings(texts, self.model, self.embed_uncached)
+
+    async def aembed(self, texts, client=None):
+        """Embed texts in a worker thread, since the model runs on this machine's CPU"""
+        return await asyncio.to_thread(self.embed, texts)
+
+BACKENDS = {
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    LocalEmbeddingBackend.name: LocalEmbeddingBackend
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_embedding_backend(name=None):
+    """
+    Get the shared embedding backend instance.
+
+    Args:
+        name: 'openai' or 'local' (defaults to the EMBEDDING_BACKEND environment variable)
+
+    Returns:
+        The embedding backend
+    """
+    name = (name or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Use one of: {', '.join(BACKENDS)}")
+
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+def get_backend_for_collection(collection):
+    """
+    Get the backend matching the model a collection was built with.
+
+    Collections created before the model was recorded in their metadata
+    fall back to the EMBEDDING_BACKEND environment variable.
+    """
+    model = (collection.metadata or {}).get("embedding_model") if collection else None
+    for name, backend_class in BACKENDS.items():
+        if backend_class.default_model == model:
+            return get_embedding_backend(name)
+    return get_embedding_backend()
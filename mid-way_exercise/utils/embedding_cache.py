@@ -0,0 +1,213 @@
+"""
+Persistent Embedding Cache
+
+This file contains an on-disk cache for embeddings that is shared by the
+data loader and the Q&A tools:
+- Keyed by (model, hash of the whitespace-normalized text)
+- Stored in SQLite as compact float32 blobs
+- Bounded in size with least-recently-used eviction
+- Hit/miss counters to see how much network traffic it saves
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    str(Path(__file__).parent / "embedding_cache.sqlite")
+)
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+def normalize_text(text):
+    """Normalize text so whitespace-only differences share one cache entry"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+def make_cache_key(model, text):
+    """Build the cache key for a (model, text) pair"""
+    normalized = normalize_text(text)
+    return hashlib.sha256(f"{model}\0{normalized}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        self.connection.commit()
+
+    def get_many(self, model, texts):
+        """
+        Look up embeddings for texts.
+
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            List with an embedding for each hit and None for each miss
+        """
+        keys = [make_cache_key(model, text) for text in texts]
+        found = {}
+
+        with self.lock:
+            # Stay well below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                batch_keys = list(set(keys[start:start + 500]))
+                placeholders = ",".join("?" * len(batch_keys))
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch_keys
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self.connection.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.connection.commit()
+
+            results = [found.get(key) for key in keys]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model, texts, embeddings):
+        """Store embeddings for texts and evict the oldest entries if the cache is full"""
+        now = time.time()
+        rows = [
+            (make_cache_key(model, text), model, array('f', embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        """Drop least-recently-used entries down to 90% of max_entries"""
+        count = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        to_remove = count - int(self.max_entries * 0.9)
+        self.connection.execute(
+            """DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+            )""",
+            (to_remove,)
+        )
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries"""
+        with self.lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries
+        }
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """Get the process-wide embedding cache"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+    return _shared_cache
+
+def find_missing(texts, model, embeddings):
+    """Map the cache key of each distinct text without an embedding to that text"""
+    missing = {}
+    for text, embedding in zip(texts, embeddings):
+        if embedding is None:
+            missing.setdefault(make_cache_key(model, text), text)
+    return missing
+
+def fill_missing(texts, model, embeddings, missing, new_embeddings):
+    """Store freshly computed embeddings and put them in place of the misses"""
+    get_embedding_cache().put_many(model, list(missing.values()), new_embeddings)
+    by_key = dict(zip(missing.keys(), new_embeddings))
+    return [
+        embedding if embedding is not None else by_key[make_cache_key(model, text)]
+        for text, embedding in zip(texts, embeddings)
+    ]
+
+def cached_embeddings(texts, model, embed_fn):
+    """
+    Embed texts through the cache.
+
+    Args:
+        texts: Texts to embed
+        model: Embedding model name (part of the cache key)
+        embed_fn: Function that embeds a list of texts, called only for misses
+
+    Returns:
+        List of embeddings in the same order as texts
+    """
+    embeddings = get_embedding_cache().get_many(model, texts)
+
+    # Embed each distinct missing text only once
+    missing = find_missing(texts, model, embeddings)
+    if missing:
+        new_embeddings = embed_fn(list(missing.values()))
+        embeddings = fill_missing(texts, model, embeddings, missing, new_embeddings)
+
+    return embeddings
+
+async def acached_embeddings(texts, model, aembed_fn):
+    """
+    Async version of cached_embeddings.
+
+    Args:
+        texts: Texts to embed
+        model: Embedding model name (part of the cache key)
+        aembed_fn: Coroutine function that embeds a list of texts, awaited only for misses
+
+    Returns:
+        List of embeddings in the same order as texts
+    """
+    embeddings = get_embedding_cache().get_many(model, texts)
+
+    missing = find_missing(texts, model, embeddings)
+    if missing:
+        new_embeddings = await aembed_fn(list(missing.values()))
+        embeddings = fill_missing(texts, model, embeddings, missing, new_embeddings)
+
+    return embeddings
@@ -0,0 +1,110 @@
+"""
+Embedding Projection for Reduced-Dimension Collections
+
+This file contains the projection used to store smaller vectors in Chroma:
+- truncate: keep the first N dimensions and re-normalize (text-embedding-3
+  models are trained so their leading dimensions carry most of the signal)
+- pca: project onto the top N principal components fitted on the chunk embeddings
+
+The loader records the projection in the collection metadata, and the Q&A
+tools apply the same projection to question embeddings.
+"""
+
+import os
+import numpy as np
+
+PROJECTIONS = ["truncate", "pca"]
+
+class EmbeddingProjection:
+    def __init__(self, dimensions, method="truncate", mean=None, components=None):
+        if method not in PROJECTIONS:
+            raise ValueError(f"Unknown projection '{method}'. Use one of: {', '.join(PROJECTIONS)}")
+        self.dimensions = dimensions
+        self.method = method
+        self.mean = mean
+        self.components = components
+
+    @property
+    def is_fitted(self):
+        return self.method == "truncate" or self.components is not None
+
+    def fit(self, embeddings):
+        """Fit the PCA components on full-dimension embeddings (no-op for truncate)"""
+        if self.method != "pca":
+            return self
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if len(vectors) < self.dimensions:
+            print(f"⚠️ Fitting PCA to {self.dimensions} dims on only {len(vectors)} vectors; "
+                  f"extra dimensions will carry no information")
+
+        self.mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        components = np.zeros((self.dimensions, vectors.shape[1]), dtype=np.float32)
+        rank = min(self.dimensions, vt.shape[0])
+        components[:rank] = vt[:rank]
+        self.components = components
+        return self
+
+    def apply(self, embeddings):
+        """
+        Project embeddings to the reduced dimension.
+
+        Args:
+            embeddings: List of full-dimension embeddings
+
+        Returns:
+            List of unit-length reduced embeddings
+        """
+        if not self.is_fitted:
+            raise ValueError("PCA projection must be fitted before it is applied")
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.method == "truncate":
+            reduced = vectors[:, :self.dimensions]
+        else:
+            reduced = (vectors - self.mean) @ self.components.T
+
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (reduced / norms).tolist()
+
+    def save(self, path):
+        """Save the fitted PCA components (truncate needs no file)"""
+        if self.method == "pca":
+            np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path, dimensions, method):
+        """Load a projection, reading PCA components from disk when needed"""
+        projection = cls(dimensions, method)
+        if method == "pca" and os.path.exists(path):
+            data = np.load(path)
+            projection.mean = data["mean"]
+            projection.components = data["components"]
+        return projection
+
+def projection_path(chroma_path, collection_name):
+    """Where the PCA components of a collection are stored"""
+    return os.path.join(chroma_path, f"{collection_name}_pca.npz")
+
+def load_projection_for_collection(collection, chroma_path):
+    """
+    Load the projection recorded in a collection's metadata.
+
+    Returns:
+        EmbeddingProjection, or None for full-dimension collections
+    """
+    metadata = (collection.metadata or {}) if collection else {}
+    dimensions = metadata.get("embedding_dimensions")
+    if not dimensions:
+        return None
+
+    method = metadata.get("projection", "truncate")
+    projection = EmbeddingProjection.load(
+        projection_path(chroma_path, collection.name), int(dimensions), method
+    )
+    if not projection.is_fitted:
+        print(f"⚠️ PCA components for {collection.name} not found in {chroma_path}")
+        return None
+    return projection
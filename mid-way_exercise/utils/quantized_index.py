@@ -0,0 +1,194 @@
+"""
+Quantized Vector Index for Retrieval Tools
+
+This file contains a second retrieval backend for the Q&A tools:
+- int8 (per-dimension scaled) or binary (sign bit) copies of the chunk embeddings
+  are kept in one contiguous NumPy array for a fast approximate scan
+- The top candidates are rescored with the full-precision vectors, which stay
+  on disk and are memory-mapped so only the rescored rows are read
+- Documents and metadata are fetched from Chroma for the final results only
+- Every ingest removes the saved index, so the next query rebuilds it; an index
+  loaded from disk is only used if its chunk ids match the collection's
+
+Select it with RETRIEVAL_BACKEND=int8 or RETRIEVAL_BACKEND=binary.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+QUANTIZATION_MODES = ["int8", "binary"]
+
+# Rows scanned per block, keeps the temporary float32 copy of int8 rows small
+SCAN_BLOCK_SIZE = 65536
+
+# Number of set bits for every byte value, used for Hamming distances
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def quantized_index_dir(chroma_path, collection_name):
+    """Where the quantized index of a collection is stored"""
+    return os.path.join(chroma_path, f"{collection_name}_quantized")
+
+def remove_quantized_index(chroma_path, collection_name):
+    """Mark the saved index of a collection as stale, so the next query rebuilds it"""
+    ids_path = os.path.join(quantized_index_dir(chroma_path, collection_name), "ids.json")
+    if os.path.exists(ids_path):
+        os.remove(ids_path)
+
+def ids_fingerprint(ids):
+    """Hash of the sorted chunk ids; it changes when any chunk is added, replaced or removed"""
+    digest = hashlib.sha256()
+    for chunk_id in sorted(ids):
+        digest.update(chunk_id.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+class QuantizedIndex:
+    def __init__(self, ids, full_vectors, mode="int8"):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{mode}'. Use one of: {', '.join(QUANTIZATION_MODES)}")
+        self.ids = ids
+        self.full_vectors = full_vectors
+        self.mode = mode
+        self.fingerprint = ids_fingerprint(ids)
+        self.saved_at = None
+
+        if mode == "int8":
+            self.scales = np.abs(full_vectors).max(axis=0) / 127.0
+            self.scales[self.scales == 0] = 1.0
+            self.codes = np.ascontiguousarray(
+                np.clip(np.round(full_vectors / self.scales), -127, 127).astype(np.int8)
+            )
+        else:
+            self.scales = None
+            self.codes = np.ascontiguousarray(np.packbits(full_vectors > 0, axis=1))
+
+    @classmethod
+    def build(cls, collection, directory, mode="int8"):
+        """
+        Build the index from a Chroma collection and save the full vectors to disk.
+
+        Args:
+            collection: Chroma collection to index
+            directory: Folder for the memory-mapped full-precision vectors
+            mode: 'int8' or 'binary'
+        """
+        data = collection.get(include=["embeddings"])
+        vectors = np.asarray(data['embeddings'], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "full_vectors.npy"), vectors)
+        with open(os.path.join(directory, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(data['ids'], f)
+
+        print(f"🗜️ Built {mode} index over {len(data['ids'])} chunks")
+        return cls.load(directory, mode)
+
+    @classmethod
+    def load(cls, directory, mode="int8"):
+        """Load a saved index, memory-mapping the full-precision vectors"""
+        ids_path = os.path.join(directory, "ids.json")
+        with open(ids_path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        full_vectors = np.load(os.path.join(directory, "full_vectors.npy"), mmap_mode="r")
+        index = cls(ids, full_vectors, mode)
+        index.saved_at = os.path.getmtime(ids_path)
+        return index
+
+    def approximate_scores(self, query):
+        """Score every chunk against the query using the quantized codes (higher is better)"""
+        if self.mode == "binary":
+            query_bits = np.packbits(query > 0)
+            return -POPCOUNT[np.bitwise_xor(self.codes, query_bits)].sum(axis=1, dtype=np.int32)
+
+        weights = (query * self.scales).astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_BLOCK_SIZE):
+            block = self.codes[start:start + SCAN_BLOCK_SIZE]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights
+        return scores
+
+    def search(self, query_embedding, n_results, n_candidates=None):
+        """
+        Find the nearest chunks with an approximate scan and exact rescoring.
+
+        Args:
+            query_embedding: Question embedding
+            n_results: Number of results to return
+            n_candidates: Candidates to rescore (defaults to 4x n_results)
+
+        Returns:
+            (ids, distances) with squared L2 distances between unit vectors,
+            the same scale Chroma reports by default
+        """
+        if not self.ids:
+            return [], []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        n_results = min(n_results, len(self.ids))
+        n_candidates = min(max(n_candidates or 4 * n_results, n_results), len(self.ids))
+
+        scores = self.approximate_scores(query)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates.sort()  # sequential reads from the memory map
+
+        similarities = np.asarray(self.full_vectors[candidates]) @ query
+        order = np.argsort(-similarities)[:n_results]
+
+        ids = [self.ids[candidates[i]] for i in order]
+        distances = [float(2.0 - 2.0 * similarities[i]) for i in order]
+        return ids, distances
+
+    def query(self, collection, query_embedding, n_results, n_candidates=None):
+        """Search and return results shaped like collection.query for one question"""
+        ids, distances = self.search(query_embedding, n_results, n_candidates)
+        documents = {}
+        metadatas = {}
+        if ids:
+            found = collection.get(ids=ids, include=["documents", "metadatas"])
+            documents = dict(zip(found['ids'], found['documents']))
+            metadatas = dict(zip(found['ids'], found['metadatas']))
+            # Chunks deleted since the index was built are left out
+            kept = [i for i, chunk_id in enumerate(ids) if chunk_id in documents]
+            ids = [ids[i] for i in kept]
+            distances = [distances[i] for i in kept]
+        return {
+            'ids': [ids],
+            'documents': [[documents[chunk_id] for chunk_id in ids]],
+            'metadatas': [[metadatas[chunk_id] or {} for chunk_id in ids]],
+            'distances': [distances]
+        }
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_quantized_index(collection, chroma_path, mode="int8"):
+    """
+    Get the quantized index for a collection, building it on first use.
+
+    The index in memory is dropped when the saved one was removed or rebuilt,
+    also by another process. A saved index is only used if its chunk ids match
+    the collection's, so edits that keep the chunk count still rebuild it.
+    """
+    directory = quantized_index_dir(chroma_path, collection.name)
+    ids_path = os.path.join(directory, "ids.json")
+    with _indexes_lock:
+        saved_at = os.path.getmtime(ids_path) if os.path.exists(ids_path) else None
+        index = _indexes.get((collection.name, mode))
+        if index is not None and index.saved_at != saved_at:
+            index = None
+        if index is None and saved_at is not None:
+            index = QuantizedIndex.load(directory, mode)
+            if index.fingerprint != ids_fingerprint(collection.get(include=[])['ids']):
+                print("🗜️ Saved quantized index does not match the collection, rebuilding it")
+                index = None
+        if index is None or len(index.ids) != collection.count():
+            index = QuantizedIndex.build(collection, directory, mode)
+        _indexes[(collection.name, mode)] = index
+    return index
@@ -0,0 +1,86 @@
+"""
+Time-Marker Inverted Index
+
+This file contains an inverted index from normalized times to chunk ids:
+- Built at ingest time from the times_found metadata of every chunk
+- Saved as JSON next to the Chroma database
+- Loaded by the Q&A tools so exact-time questions like "What happened at 4:55 PM?"
+  are answered with a dictionary lookup before falling back to vector search
+"""
+
+import os
+import re
+import json
+
+# Matches "4:55 PM", "At 4:55pm", "4:55 p.m." and 24-hour "16:55"
+TIME_PATTERN = re.compile(r'\b(\d{1,2}):(\d{2})(?:\s*([AaPp])\.?\s*[Mm]\b\.?)?')
+
+# The times the loader records in a chunk's times_found and has_time_marker metadata
+MARKER_TIME_PATTERN = re.compile(r'\b(?:At\s+)?\d{1,2}:\d{2}\s*(?:AM|PM)\b')
+
+def normalize_time(hours, minutes, meridiem=None):
+    """Turn hour, minute and optional AM/PM parts into 24-hour 'HH:MM'"""
+    hours = int(hours)
+    if meridiem:
+        meridiem = meridiem.upper()
+        if meridiem == 'P' and hours != 12:
+            hours += 12
+        elif meridiem == 'A' and hours == 12:
+            hours = 0
+    return f"{hours:02d}:{minutes}"
+
+def extract_normalized_times(text):
+    """Find all times in text as normalized 'HH:MM' strings, in order and without duplicates"""
+    times = [normalize_time(*match) for match in TIME_PATTERN.findall(text)]
+    return list(dict.fromkeys(times))
+
+def build_time_index(collection):
+    """
+    Build the index from the times_found metadata of every chunk in a collection.
+
+    Returns:
+        Dict mapping 'HH:MM' to a list of chunk ids
+    """
+    data = collection.get(include=["metadatas"])
+    index = {}
+    for chunk_id, metadata in zip(data['ids'], data['metadatas']):
+        for time in extract_normalized_times((metadata or {}).get('times_found', '')):
+            index.setdefault(time, []).append(chunk_id)
+    return index
+
+def time_index_path(chroma_path, collection_name):
+    """Where the time index of a collection is stored"""
+    return os.path.join(chroma_path, f"{collection_name}_time_index.json")
+
+def save_time_index(collection, chroma_path):
+    """Rebuild the time index for a collection and save it to disk"""
+    index = build_time_index(collection)
+    with open(time_index_path(chroma_path, collection.name), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    print(f"🕒 Saved time index with {len(index)} distinct times")
+    return index
+
+def load_time_index(chroma_path, collection_name):
+    """Load the time index of a collection, or an empty index if none was built"""
+    path = time_index_path(chroma_path, collection_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def lookup_time_chunks(question, index):
+    """
+    Find chunk ids that mention a time asked about in the question.
+
+    Returns:
+        List of chunk ids (empty if the question has no time or no chunk matches)
+    """
+    chunk_ids = []
+    for hours, minutes, meridiem in TIME_PATTERN.findall(question):
+        candidates = [normalize_time(hours, minutes, meridiem)]
+        if not meridiem and int(hours) < 12:
+            # "at 4:55" could mean either 04:55 or 16:55
+            candidates.append(normalize_time(int(hours) + 12, minutes))
+        for time in candidates:
+            chunk_ids.extend(index.get(time, []))
+    return list(dict.fromkeys(chunk_ids))
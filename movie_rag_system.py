@@ -13,14 +13,43 @@ import time
 
 load_dotenv()
 
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+def get_embedding_backend_name(backend=None):
+    """Resolve the embedding backend name: 'openai' (default) or 'local'"""
+    return (backend or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+
+def create_embeddings(backend=None):
+    """Create the embedding model: 'openai' (default) or 'local' for offline CPU inference"""
+    backend = get_embedding_backend_name(backend)
+    if backend == "local":
+        import torch
+        from langchain.embeddings import HuggingFaceEmbeddings
+        
+        num_threads = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        # sentence-transformers sorts inputs by length before batching, so large
+        # batches stay cheap to pad
+        return HuggingFaceEmbeddings(
+            model_name=LOCAL_EMBEDDING_MODEL,
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={
+                "batch_size": int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "256")),
+                "normalize_embeddings": True
+            }
+        )
+    return OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+
 class MovieRAGSystem:
-    def __init__(self):
+    def __init__(self, embedding_backend=None):
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.1,
             api_key=os.getenv("OPENAI_API_KEY")
         )
-        self.embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+        self.embedding_backend = get_embedding_backend_name(embedding_backend)
+        self.embeddings = create_embeddings(self.embedding_backend)
         self.vector_db = None
         self.movies_data = []
         
@@ -113,7 +142,9 @@ class MovieRAGSystem:
         self.vector_db = Chroma.from_documents(
             documents=split_docs,
             embedding=self.embeddings,
-            persist_directory="./movie_vector_db"
+            persist_directory="./movie_vector_db",
+            # Each backend has its own collection, their vectors have different dimensions
+            collection_name=f"movies_{self.embedding_backend}"
         )
         
         print(f"Vector database created with {len(split_docs)} chunks")